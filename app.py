@@ -8,17 +8,67 @@ El servidor expone los endpoints `/api/voices`, `/api/synthesize` y
 """
 from __future__ import annotations
 
+import math
 import os
 import pathlib
-
-from flask import Flask, jsonify, render_template, request, send_from_directory, url_for
-
-from tts_engine import CONFIG_BACKUP_DIR, OUTPUT_DIR, TTSEngine, ConfigError, SynthesisError, VoiceNotFoundError
-from model_sync import sync_models_if_needed
+import time
+
+from flask import Flask, Response, jsonify, render_template, request, send_from_directory, url_for
+from flask_sock import Sock
+
+from tts_engine import (
+    CONFIG_BACKUP_DIR,
+    DEFAULT_OUTPUT_PROFILE,
+    DeadlineExceededError,
+    OUTPUT_DIR,
+    OUTPUT_PROFILES,
+    StageTimings,
+    TTSEngine,
+    ConfigError,
+    SynthesisError,
+    TemplateError,
+    VoiceNotFoundError,
+)
+from model_sync import ModelSyncError, sync_models_if_needed
+from profiler import ProfilerBusyError, SamplingProfiler
+from streaming import serve_incremental_synthesis
+from traffic import TrafficRecorder
 
 app = Flask(__name__)
+sock = Sock(app)
 SYNCED, SYNC_MESSAGE = sync_models_if_needed()
 tts_engine = TTSEngine()
+PROFILER_ENABLED = os.environ.get("TTS_ENABLE_PROFILER", "").lower() in {"1", "true", "yes"}
+profiler = SamplingProfiler()
+traffic_recorder = TrafficRecorder.from_env()
+# Tope del plazo por petición; valores mayores se recortan.
+MAX_DEADLINE_MS = 10 * 60 * 1000.0
+
+
+def _parse_deadline_ms(payload: dict) -> float | None:
+    """Lee el plazo opcional de la petición (en ms desde su llegada)."""
+
+    raw = payload.get("deadline_ms")
+    if raw in (None, ""):
+        return None
+    deadline_ms = float(raw)
+    # JSON admite ``1e309`` e ``Infinity``; ``nan`` también pasaría la comparación.
+    if not math.isfinite(deadline_ms) or deadline_ms <= 0:
+        raise ValueError("deadline_ms debe ser un número positivo y finito")
+    return min(deadline_ms, MAX_DEADLINE_MS)
+
+
+def _deadline_response(exc: DeadlineExceededError):
+    """Rechazo temprano cuando el plazo no puede cumplirse.
+
+    Se usa 429 y no 503: el enrutador interpreta 503 como nodo caído y
+    reintentaría en otro nodo, que tendría que cargar el modelo en frío.
+    """
+
+    estimated_ms = round(exc.estimated_seconds * 1000.0, 3)
+    response = jsonify({"success": False, "error": str(exc), "estimated_ms": estimated_ms})
+    response.headers["Retry-After"] = str(max(1, int(exc.estimated_seconds + 0.999)))
+    return response, 429
 
 
 def _get_api_base_url() -> str:
@@ -53,10 +103,25 @@ def voices():
             "synced": SYNCED,
             "message": SYNC_MESSAGE,
             "missing_models": tts_engine.missing_voices(),
+            "output_profiles": tts_engine.output_profiles(),
         }
     )
 
 
+@app.route("/api/models/sync", methods=["POST"])
+def sync_models_route():
+    """Sincroniza los modelos con el repositorio remoto de forma incremental."""
+
+    global SYNCED, SYNC_MESSAGE
+    try:
+        report = tts_engine.resync_models()
+    except ModelSyncError as exc:  # pragma: no cover - dependiente de red
+        return jsonify({"success": False, "error": str(exc)}), 502
+
+    SYNCED, SYNC_MESSAGE = True, report.summary()
+    return jsonify({"success": True, "message": SYNC_MESSAGE, **report.as_dict()})
+
+
 @app.route("/api/config/<voice_id>", methods=["GET", "POST"])
 def config(voice_id: str):
     """Devuelve o actualiza el archivo de configuración de una voz."""
@@ -96,32 +161,177 @@ def restore_config(voice_id: str):
 def synthesize():
     """Genera audio localmente usando los modelos descargados."""
 
+    arrival = time.time()
     payload = request.get_json(force=True, silent=True) or {}
     text = str(payload.get("text") or "").strip()
     voice_id = str(payload.get("voice") or "").strip()
     speed = float(payload.get("speed") or 1.0)
+    output_profile = str(payload.get("output_profile") or "").strip() or None
 
     if not text:
         return jsonify({"success": False, "error": "El texto es obligatorio"}), 400
     if not voice_id:
         return jsonify({"success": False, "error": "Debes seleccionar una voz"}), 400
+    if output_profile and output_profile not in OUTPUT_PROFILES:
+        return jsonify({"success": False, "error": f"Perfil de salida '{output_profile}' no soportado"}), 400
+    try:
+        deadline_ms = _parse_deadline_ms(payload)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "'deadline_ms' debe ser un número positivo y finito"}), 400
+
+    debug = bool(payload.get("debug")) or request.args.get("debug") in {"1", "true"}
+    timings = StageTimings()
+    started = time.perf_counter()
+    capture = traffic_recorder is not None and traffic_recorder.should_sample()
+
+    def record(status: int, result_bytes: int = 0) -> None:
+        if capture:
+            traffic_recorder.record(
+                arrival=arrival,
+                text=text,
+                voice=voice_id,
+                speed=speed,
+                output_profile=output_profile,
+                latency_ms=(time.perf_counter() - started) * 1000.0,
+                status=status,
+                result_bytes=result_bytes,
+            )
 
     try:
-        filename, output_path = tts_engine.synthesize(text, voice_id, speed)
+        filename, output_path = tts_engine.synthesize(
+            text, voice_id, speed, output_profile, timings=timings, deadline_ms=deadline_ms
+        )
     except VoiceNotFoundError as exc:
+        record(404)
         return jsonify({"success": False, "error": str(exc)}), 404
+    except DeadlineExceededError as exc:
+        record(429)
+        return _deadline_response(exc)
+    except SynthesisError as exc:  # pragma: no cover - dependiente de modelo
+        record(500)
+        response = jsonify({"success": False, "error": str(exc)})
+        response.headers["Server-Timing"] = timings.as_server_timing()
+        return response, 500
+
+    timings.stages["total"] = (time.perf_counter() - started) * 1000.0
+    try:
+        record(200, output_path.stat().st_size)
+    except OSError:
+        record(200)
+    download_url = url_for("download_audio", filename=output_path.name, _external=False)
+    body = {
+        "success": True,
+        "voice": voice_id,
+        "filename": filename,
+        "download_url": download_url,
+        "output_profile": output_profile or DEFAULT_OUTPUT_PROFILE,
+    }
+    if debug:
+        body["timings"] = timings.as_dict()
+
+    response = jsonify(body)
+    response.headers["Server-Timing"] = timings.as_server_timing()
+    return response
+
+
+@app.route("/api/estimate")
+def estimate():
+    """Estima la duración de la síntesis y la espera en cola.
+
+    Sin ``voice`` devuelve los modelos de costo aprendidos por voz.
+    """
+
+    voice_id = str(request.args.get("voice") or "").strip()
+    if not voice_id:
+        return jsonify({"success": True, "cost_models": tts_engine.scheduler.cost_model.as_dict()})
+
+    try:
+        data = tts_engine.estimate_cost(voice_id, str(request.args.get("text") or ""))
+    except VoiceNotFoundError as exc:
+        return jsonify({"success": False, "error": str(exc)}), 404
+    return jsonify({"success": True, "voice": voice_id, **data})
+
+
+@app.route("/api/synthesize-template", methods=["POST"])
+def synthesize_template():
+    """Genera audio desde una plantilla reutilizando los fragmentos fijos cacheados."""
+
+    payload = request.get_json(force=True, silent=True) or {}
+    template = str(payload.get("template") or "")
+    values = payload.get("values") or {}
+    voice_id = str(payload.get("voice") or "").strip()
+    speed = float(payload.get("speed") or 1.0)
+    output_profile = str(payload.get("output_profile") or "").strip() or None
+
+    if not template.strip():
+        return jsonify({"success": False, "error": "La plantilla es obligatoria"}), 400
+    if not isinstance(values, dict):
+        return jsonify({"success": False, "error": "'values' debe ser un objeto"}), 400
+    if not voice_id:
+        return jsonify({"success": False, "error": "Debes seleccionar una voz"}), 400
+    if output_profile and output_profile not in OUTPUT_PROFILES:
+        return jsonify({"success": False, "error": f"Perfil de salida '{output_profile}' no soportado"}), 400
+    try:
+        deadline_ms = _parse_deadline_ms(payload)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "'deadline_ms' debe ser un número positivo y finito"}), 400
+
+    timings = StageTimings()
+    try:
+        filename, output_path = tts_engine.synthesize_template(
+            template, values, voice_id, speed, output_profile, timings=timings, deadline_ms=deadline_ms
+        )
+    except VoiceNotFoundError as exc:
+        return jsonify({"success": False, "error": str(exc)}), 404
+    except DeadlineExceededError as exc:
+        return _deadline_response(exc)
+    except TemplateError as exc:
+        return jsonify({"success": False, "error": str(exc)}), 400
     except SynthesisError as exc:  # pragma: no cover - dependiente de modelo
         return jsonify({"success": False, "error": str(exc)}), 500
 
     download_url = url_for("download_audio", filename=output_path.name, _external=False)
-    return jsonify(
+    response = jsonify(
         {
             "success": True,
             "voice": voice_id,
             "filename": filename,
             "download_url": download_url,
+            "output_profile": output_profile or DEFAULT_OUTPUT_PROFILE,
         }
     )
+    response.headers["Server-Timing"] = timings.as_server_timing()
+    return response
+
+
+@sock.route("/ws/synthesize")
+def synthesize_incremental(ws):
+    """Sintetiza texto incremental oración por oración sobre un WebSocket."""
+
+    serve_incremental_synthesis(ws, tts_engine)
+
+
+@app.route("/api/debug/profile")
+def debug_profile():
+    """Captura un perfil por muestreo de la síntesis en formato folded (flamegraph).
+
+    Sólo está disponible si ``TTS_ENABLE_PROFILER`` está activo.
+    """
+
+    if not PROFILER_ENABLED:
+        return jsonify({"success": False, "error": "El perfilador no está habilitado"}), 404
+
+    try:
+        seconds = float(request.args.get("seconds") or 10)
+    except ValueError:
+        return jsonify({"success": False, "error": "Parámetro 'seconds' inválido"}), 400
+
+    try:
+        samples = profiler.profile(seconds, all_threads=request.args.get("all") in {"1", "true"})
+    except ProfilerBusyError as exc:
+        return jsonify({"success": False, "error": str(exc)}), 409
+
+    return Response(profiler.as_folded(samples), mimetype="text/plain")
 
 
 @app.route("/api/upload-file", methods=["POST"])
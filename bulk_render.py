@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Renderizado masivo sin servidor a partir de manifiestos JSONL.
+
+Cada línea del manifiesto describe un audio a generar::
+
+    {"id": "bienvenida", "text": "Hola", "voice": "es-ar-daniela-high", "speed": 1.0, "output": "bienvenida.wav"}
+
+Los elementos se agrupan por voz y se reparten en lotes entre un pool de
+procesos; cada proceso mantiene su propio ``TTSEngine``, por lo que cada
+modelo se carga una sola vez por proceso. Los audios se escriben primero en un
+archivo temporal y se renombran al terminar, de modo que al reanudar basta con
+omitir los elementos cuya salida ya existe.
+
+Este módulo no importa Flask ni ejecuta ``sync_models_if_needed``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from itertools import groupby
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tts_engine import OUTPUT_DIR, OUTPUT_PROFILES, TTSEngine
+
+_worker_engine: Optional[TTSEngine] = None
+
+
+@dataclass
+class RenderItem:
+    """Elemento del manifiesto listo para sintetizarse."""
+
+    id: str
+    text: str
+    voice: str
+    speed: float
+    output: str
+
+
+def _load_manifest(path: Path) -> Tuple[List[RenderItem], List[str]]:
+    """Lee el manifiesto JSONL y devuelve (elementos válidos, errores)."""
+
+    items: List[RenderItem] = []
+    errors: List[str] = []
+    seen_outputs: Dict[str, str] = {}
+
+    with path.open(encoding="utf-8") as manifest:
+        for line_number, line in enumerate(manifest, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                errors.append(f"línea {line_number}: JSON inválido")
+                continue
+            if not isinstance(entry, dict):
+                errors.append(f"línea {line_number}: se esperaba un objeto")
+                continue
+
+            item_id = str(entry.get("id") or line_number)
+            text = str(entry.get("text") or "").strip()
+            voice = str(entry.get("voice") or "").strip()
+            output = Path(str(entry.get("output") or f"{item_id}.wav")).name
+            try:
+                speed = float(entry.get("speed") or 1.0)
+            except (TypeError, ValueError):
+                errors.append(f"línea {line_number}: velocidad inválida")
+                continue
+
+            if not text or not voice:
+                errors.append(f"línea {line_number}: faltan 'text' o 'voice'")
+                continue
+            if not output.endswith(".wav"):
+                output += ".wav"
+            if output in seen_outputs:
+                errors.append(f"línea {line_number}: salida '{output}' repetida (id {seen_outputs[output]})")
+                continue
+
+            seen_outputs[output] = item_id
+            items.append(RenderItem(id=item_id, text=text, voice=voice, speed=speed, output=output))
+
+    return items, errors
+
+
+def _batches_by_voice(items: Iterable[RenderItem], batch_size: int) -> List[List[RenderItem]]:
+    """Agrupa por voz para que cada lote use un solo modelo en su proceso."""
+
+    batches: List[List[RenderItem]] = []
+    ordered = sorted(items, key=lambda item: item.voice)
+    for _, group in groupby(ordered, key=lambda item: item.voice):
+        voice_items = list(group)
+        for start in range(0, len(voice_items), batch_size):
+            batches.append(voice_items[start : start + batch_size])
+    return batches
+
+
+def _init_worker() -> None:
+    global _worker_engine
+    _worker_engine = TTSEngine(auto_sync=False)
+
+
+def _render_batch(
+    batch: List[RenderItem], output_dir: str, output_profile: Optional[str]
+) -> List[Dict[str, object]]:
+    """Sintetiza un lote dentro de un proceso del pool."""
+
+    import soundfile as sf
+
+    engine = _worker_engine or TTSEngine(auto_sync=False)
+    results: List[Dict[str, object]] = []
+    for item in batch:
+        final_path = Path(output_dir) / item.output
+        temp_path = final_path.with_name(f".{final_path.stem}.part.wav")
+        started = time.perf_counter()
+        try:
+            engine.synthesize(item.text, item.voice, item.speed, output_profile, output_path=temp_path)
+            duration = float(sf.info(str(temp_path)).duration)
+            os.replace(temp_path, final_path)
+        except Exception as exc:  # un elemento defectuoso no debe cortar el lote
+            try:
+                temp_path.unlink()
+            except OSError:
+                pass
+            results.append({"id": item.id, "success": False, "error": str(exc)})
+            continue
+
+        results.append(
+            {
+                "id": item.id,
+                "success": True,
+                "output": str(final_path),
+                "audio_seconds": duration,
+                "render_seconds": time.perf_counter() - started,
+            }
+        )
+    return results
+
+
+def render_manifest(
+    manifest_path: Path,
+    output_dir: Path = OUTPUT_DIR,
+    workers: Optional[int] = None,
+    batch_size: int = 16,
+    output_profile: Optional[str] = None,
+) -> Dict[str, object]:
+    """Renderiza el manifiesto y devuelve un resumen con el rendimiento obtenido."""
+
+    items, errors = _load_manifest(manifest_path)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    pending = [item for item in items if not (output_dir / item.output).exists()]
+    skipped = len(items) - len(pending)
+    batches = _batches_by_voice(pending, max(1, batch_size))
+
+    rendered = 0
+    failed: List[Dict[str, object]] = []
+    audio_seconds = 0.0
+    started = time.perf_counter()
+
+    if batches:
+        max_workers = max(1, min(workers or os.cpu_count() or 1, len(batches)))
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+            futures = {
+                executor.submit(_render_batch, batch, str(output_dir), output_profile): batch for batch in batches
+            }
+            for future in as_completed(futures):
+                try:
+                    results = future.result()
+                except Exception as exc:  # p. ej. el proceso murió (BrokenProcessPool)
+                    results = [
+                        {"id": item.id, "success": False, "error": f"Falló el lote: {exc!r}"}
+                        for item in futures[future]
+                    ]
+                for result in results:
+                    if result["success"]:
+                        rendered += 1
+                        audio_seconds += float(result["audio_seconds"])
+                    else:
+                        failed.append(result)
+                        print(f"[error] {result['id']}: {result['error']}", file=sys.stderr)
+
+                done = rendered + len(failed)
+                elapsed = time.perf_counter() - started
+                print(
+                    f"[{done}/{len(pending)}] {done / elapsed if elapsed else 0.0:.2f} elementos/s",
+                    file=sys.stderr,
+                )
+
+    elapsed = time.perf_counter() - started
+    return {
+        "total": len(items),
+        "rendered": rendered,
+        "skipped": skipped,
+        "failed": failed,
+        "invalid": errors,
+        "elapsed_seconds": elapsed,
+        "items_per_second": rendered / elapsed if elapsed else 0.0,
+        "audio_seconds": audio_seconds,
+        "realtime_factor": audio_seconds / elapsed if elapsed else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Renderizado masivo de audios desde un manifiesto JSONL.")
+    parser.add_argument("manifest", type=Path, help="Manifiesto JSONL con id, text, voice, speed y output")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR, help="Carpeta de destino de los WAV")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos en paralelo (por defecto, CPUs)")
+    parser.add_argument("--batch-size", type=int, default=16, help="Elementos por lote enviado a un proceso")
+    parser.add_argument(
+        "--output-profile",
+        choices=sorted(OUTPUT_PROFILES),
+        default=None,
+        help="Perfil de salida del audio",
+    )
+    args = parser.parse_args(argv)
+
+    summary = render_manifest(
+        args.manifest,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        output_profile=args.output_profile,
+    )
+
+    for message in summary["invalid"]:
+        print(f"[manifiesto] {message}", file=sys.stderr)
+    print(
+        f"Renderizados: {summary['rendered']} | Omitidos: {summary['skipped']} | "
+        f"Fallidos: {len(summary['failed'])} | Inválidos: {len(summary['invalid'])}"
+    )
+    print(
+        f"Tiempo: {summary['elapsed_seconds']:.1f} s | {summary['items_per_second']:.2f} elementos/s | "
+        f"Audio: {summary['audio_seconds']:.1f} s ({summary['realtime_factor']:.1f}x tiempo real)"
+    )
+    return 1 if summary["failed"] or summary["invalid"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
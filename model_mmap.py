@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Sesiones ONNX con los pesos del modelo mapeados en memoria.
+
+``PiperVoice.load`` entrega el ``.onnx`` a ONNX Runtime, que lo lee completo a
+memoria privada del proceso. Cuando los inicializadores viven en un archivo de
+datos externo, ONNX Runtime los mapea con ``mmap``: las páginas salen de la
+caché de páginas del sistema operativo, se comparten entre workers y siguen
+calientes tras un reinicio.
+
+La primera vez que se carga un modelo, el propio ONNX Runtime exporta una copia
+con los pesos en un archivo ``.onnx.data`` dentro de ``MMAP_CACHE_DIR``. Cada
+exportación usa un nombre de datos propio, así un ``.onnx`` nunca queda
+apuntando a los pesos de otra exportación. La copia se identifica por el SHA-256 del modelo de origen y la versión de ONNX Runtime,
+así que sigue siendo válida aunque la sincronización vuelva a colocar el mismo
+archivo. Con ``TTS_MMAP_MODELS=0`` se vuelve a la carga tradicional.
+
+El *prepacking* de ONNX Runtime copia los pesos de ``MatMul`` a memoria privada
+con un formato propio, lo que anula el mapeo para esos tensores (los de
+``Conv``, la mayor parte de un modelo Piper, siguen compartidos). Queda activo
+porque acelera la inferencia; ``TTS_MMAP_PREPACK=0`` lo desactiva cuando pesa
+más la memoria compartida entre workers que la velocidad.
+
+Para exportar de antemano todos los modelos de ``models/`` (por ejemplo al
+construir la imagen)::
+
+    python model_mmap.py
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: sólo queda el lock entre hilos
+    fcntl = None  # type: ignore[assignment]
+
+from model_sync import CACHE_DIR, MODELS_DIR
+
+if TYPE_CHECKING:  # pragma: no cover - sólo para anotaciones
+    from onnxruntime import InferenceSession
+
+MMAP_CACHE_DIR = Path(os.environ.get("TTS_MMAP_DIR") or CACHE_DIR / "mmap")
+MMAP_ENABLED = os.environ.get("TTS_MMAP_MODELS", "1").lower() not in {"0", "false", "no"}
+MMAP_PREPACK = os.environ.get("TTS_MMAP_PREPACK", "1").lower() not in {"0", "false", "no"}
+# Los tensores más chicos quedan dentro del .onnx; no vale la pena mapearlos.
+_MIN_EXTERNAL_BYTES = 1024
+_HASH_CHUNK = 1024 * 1024
+_PROVIDERS = ["CPUExecutionProvider"]
+# Entre hilos del mismo proceso; entre procesos (workers de gunicorn, pool de
+# ``bulk_render``) se suma un ``flock`` sobre ``<modelo>.lock``.
+_export_lock = threading.Lock()
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat_key(model: Path) -> Dict[str, int]:
+    stat = model.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino}
+
+
+def _cache_stem(model: Path) -> str:
+    digest = hashlib.sha1(str(model.resolve()).encode("utf-8")).hexdigest()[:12]
+    return f"{model.stem}-{digest}"
+
+
+def _export_external_data(model: Path, target: Path, data_name: str) -> None:
+    """Reescribe ``model`` en ``target`` con los pesos en ``data_name``, junto a ``target``."""
+
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    # Sólo optimizaciones independientes del hardware: la copia sirve en cualquier nodo.
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC
+    options.optimized_model_filepath = str(target)
+    options.add_session_config_entry(
+        "session.optimized_model_external_initializers_file_name", data_name
+    )
+    options.add_session_config_entry(
+        "session.optimized_model_external_initializers_min_size_in_bytes", str(_MIN_EXTERNAL_BYTES)
+    )
+    session = onnxruntime.InferenceSession(str(model), sess_options=options, providers=_PROVIDERS)
+    del session
+
+
+@contextmanager
+def _export_guard(stem: str) -> Iterator[None]:
+    """Serializa la exportación de un modelo entre hilos y entre procesos."""
+
+    with _export_lock:
+        MMAP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with (MMAP_CACHE_DIR / f"{stem}.lock").open("a") as handle:
+            if fcntl is not None:
+                # Se libera al cerrar el archivo, también si el proceso muere.
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            yield
+
+
+def _write_sidecar(sidecar: Path, payload: Dict[str, Any]) -> None:
+    # Escritura atómica: otros procesos leen la firma sin tomar el lock.
+    temporary = sidecar.with_name(f".{sidecar.name}.{uuid.uuid4().hex}")
+    temporary.write_text(json.dumps(payload), encoding="utf-8")
+    os.replace(temporary, sidecar)
+
+
+def _read_sidecar(sidecar: Path) -> Dict[str, Any]:
+    try:
+        recorded = json.loads(sidecar.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return recorded if isinstance(recorded, dict) else {}
+
+
+def _cached_copy(model: Path, target: Path, sidecar: Path, version: str) -> Optional[Dict[str, Any]]:
+    """Devuelve la firma vigente si la copia exportada sigue valiendo para ``model``."""
+
+    recorded = _read_sidecar(sidecar)
+    if recorded.get("onnxruntime") != version or not target.exists():
+        return None
+    data_name = recorded.get("data")
+    if data_name and not (target.parent / str(data_name)).exists():
+        return None
+
+    stat = _stat_key(model)
+    if recorded.get("stat") == stat:
+        return recorded
+    # Otro inodo o fecha (p. ej. el archivo se volvió a sincronizar): decide el contenido.
+    if recorded.get("sha256") != _file_sha256(model):
+        return None
+    recorded["stat"] = stat
+    _write_sidecar(sidecar, recorded)
+    return recorded
+
+
+def _export_if_stale(model: Path, target: Path, sidecar: Path, version: str) -> Path | None:
+    """Exporta ``model`` a ``target`` salvo que la copia vigente siga valiendo."""
+
+    try:
+        if _cached_copy(model, target, sidecar, version) is not None:
+            return target
+        signature = {
+            "source": str(model.resolve()),
+            "sha256": _file_sha256(model),
+            "stat": _stat_key(model),
+            "onnxruntime": version,
+        }
+    except OSError:
+        return None
+
+    # Exportar en un directorio propio y mover después: otros procesos pueden
+    # estar usando la copia anterior. Los datos van primero y con un nombre
+    # nuevo, así el reemplazo atómico del ``.onnx`` cambia de par de una vez.
+    previous = str(_read_sidecar(sidecar).get("data") or f"{target.name}.data")
+    token = uuid.uuid4().hex
+    data_name = f"{target.stem}.{token[:12]}.onnx.data"
+    staging = MMAP_CACHE_DIR / f".tmp-{token}"
+    try:
+        staging.mkdir(parents=True)
+        _export_external_data(model, staging / target.name, data_name)
+        if (staging / data_name).exists():
+            os.replace(staging / data_name, MMAP_CACHE_DIR / data_name)
+            signature["data"] = data_name
+        os.replace(staging / target.name, target)
+        _write_sidecar(sidecar, signature)
+    except Exception:  # pragma: no cover - depende del modelo y de la versión de ORT
+        return None
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    # Se conservan también los datos anteriores: un proceso que acaba de leer el
+    # ``.onnx`` viejo todavía puede estar abriéndolos.
+    keep = {data_name, previous}
+    for stale in MMAP_CACHE_DIR.glob(f"{target.stem}.*onnx.data"):
+        if stale.name not in keep:
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+    return target
+
+
+def prepare_mmap_model(model: Path) -> Path | None:
+    """Devuelve la copia con datos externos de ``model``, exportándola si falta o está vencida.
+
+    Si la exportación falla se devuelve ``None`` para que el llamador cargue el
+    modelo original.
+    """
+
+    import onnxruntime
+
+    stem = _cache_stem(model)
+    target = MMAP_CACHE_DIR / f"{stem}.onnx"
+    sidecar = MMAP_CACHE_DIR / f"{stem}.json"
+
+    try:
+        if _cached_copy(model, target, sidecar, onnxruntime.__version__) is not None:
+            return target
+        with _export_guard(stem):
+            # Se vuelve a comprobar: otro proceso pudo exportar mientras se esperaba el lock.
+            return _export_if_stale(model, target, sidecar, onnxruntime.__version__)
+    except OSError:
+        return None
+
+
+def create_session(model: Path) -> "InferenceSession":
+    """Crea la sesión de inferencia de ``model``, con pesos mapeados si es posible."""
+
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    mapped = prepare_mmap_model(model) if MMAP_ENABLED else None
+    if mapped is not None and not MMAP_PREPACK:
+        options.add_session_config_entry("session.disable_prepacking", "1")
+    return onnxruntime.InferenceSession(str(mapped or model), sess_options=options, providers=_PROVIDERS)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Exporta la copia mapeable de cada ``.onnx`` de ``models/`` (o de las rutas dadas)."""
+
+    paths = [Path(arg) for arg in (argv if argv is not None else sys.argv[1:])]
+    if not paths:
+        paths = sorted(
+            path
+            for path in MODELS_DIR.rglob("*.onnx")
+            if not any(part.startswith(".") for part in path.relative_to(MODELS_DIR).parts)
+        )
+
+    failed = 0
+    for path in paths:
+        target = prepare_mmap_model(path)
+        print(f"{path} -> {target or 'ERROR'}")
+        failed += target is None
+    return 1 if failed else 0
+
+
+__all__ = ["MMAP_CACHE_DIR", "MMAP_ENABLED", "MMAP_PREPACK", "create_session", "prepare_mmap_model"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,19 +7,27 @@ respaldo para que el frontend siga funcionando.
 """
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import shutil
 import subprocess
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Set, Tuple
 
 BASE_DIR = Path(__file__).parent
 MODELS_DIR = BASE_DIR / "models"
 CACHE_DIR = BASE_DIR / ".cache"
 REPO_CACHE = CACHE_DIR / "tts-piper-2"
 DEFAULT_REPO = "https://github.com/lbadilla2021/tt-piper-2.git"
+MANIFEST_NAME = ".sync_manifest.json"
+SOURCE_MANIFEST = CACHE_DIR / "models_manifest.json"
+# Los modelos ONNX nunca se editan en sitio, así que pueden compartirse con la
+# caché mediante hardlinks; los JSON se copian porque el editor los reescribe.
+LINKABLE_SUFFIXES = {".onnx"}
+_HASH_CHUNK = 1024 * 1024
 
 
 class ModelSyncError(RuntimeError):
@@ -48,8 +56,43 @@ class Voice:
         }
 
 
-def _run(cmd: List[str]) -> None:
-    """Ejecuta un comando y lanza ModelSyncError si falla."""
+@dataclass
+class SyncReport:
+    """Resultado de una sincronización incremental de ``MODELS_DIR``."""
+
+    added: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    linked: int = 0
+    changed_voices: List[str] = field(default_factory=list)
+
+    @property
+    def changed_files(self) -> List[str]:
+        return self.added + self.updated + self.removed
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "added": self.added,
+            "updated": self.updated,
+            "removed": self.removed,
+            "unchanged": self.unchanged,
+            "linked": self.linked,
+            "changed_voices": self.changed_voices,
+        }
+
+    def summary(self) -> str:
+        if not self.changed_files:
+            return "Modelos sincronizados: sin cambios"
+        voices = ", ".join(self.changed_voices) or "ninguna"
+        return (
+            f"Modelos sincronizados: {len(self.added)} nuevos, {len(self.updated)} actualizados, "
+            f"{len(self.removed)} eliminados; voces afectadas: {voices}"
+        )
+
+
+def _run(cmd: List[str]) -> str:
+    """Ejecuta un comando, devuelve su salida y lanza ModelSyncError si falla."""
 
     try:
         result = subprocess.run(cmd, capture_output=True, text=True)
@@ -57,6 +100,7 @@ def _run(cmd: List[str]) -> None:
         raise ModelSyncError("git no está instalado en la imagen del contenedor") from exc
     if result.returncode != 0:
         raise ModelSyncError(result.stderr.strip() or "No fue posible ejecutar git")
+    return result.stdout.strip()
 
 
 def _clone_models_repo(repo_url: str = DEFAULT_REPO) -> None:
@@ -66,6 +110,10 @@ def _clone_models_repo(repo_url: str = DEFAULT_REPO) -> None:
 
     if (REPO_CACHE / ".git").exists():
         _run(["git", "-C", str(REPO_CACHE), "fetch", "--depth", "1", "origin", "main"])
+        # Siempre restaurar el checkout aunque HEAD ya sea origin/main: los .onnx
+        # están enlazados con ``models/``, así que un daño en sitio allí también
+        # altera la caché. git reescribe el archivo (con un inodo nuevo) y el daño
+        # en ``models/`` vuelve a detectarse al comparar hashes.
         _run(["git", "-C", str(REPO_CACHE), "reset", "--hard", "origin/main"])
         return
 
@@ -77,6 +125,8 @@ def _clone_models_repo(repo_url: str = DEFAULT_REPO) -> None:
             "1",
             "--filter=blob:none",
             "--sparse",
+            "--branch",
+            "main",
             repo_url,
             str(REPO_CACHE),
         ]
@@ -84,28 +134,174 @@ def _clone_models_repo(repo_url: str = DEFAULT_REPO) -> None:
     _run(["git", "-C", str(REPO_CACHE), "sparse-checkout", "set", "models"])
 
 
-def _copy_models_folder() -> Path:
-    """Copia la carpeta ``models`` del repo cacheado a ``MODELS_DIR"""
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_manifest(path: Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _write_manifest(path: Path, manifest: Dict[str, Dict[str, Any]]) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    except OSError:
+        # Sin manifiesto la próxima sincronización sólo vuelve a calcular los hashes.
+        pass
+
+
+def _scan_tree(root: Path, previous: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Calcula el hash de cada archivo de ``root`` en paralelo.
+
+    Se omiten rutas con componentes ocultos (respaldos, manifiestos, ``.git``).
+    Si tamaño y mtime coinciden con el manifiesto previo se reutiliza el hash.
+    """
+
+    if not root.exists():
+        return {}
+
+    files: Dict[str, Path] = {}
+    for path in root.rglob("*"):
+        relative = path.relative_to(root)
+        if any(part.startswith(".") for part in relative.parts) or not path.is_file():
+            continue
+        files[relative.as_posix()] = path
+
+    manifest: Dict[str, Dict[str, Any]] = {}
+    to_hash: List[str] = []
+    for relative, path in files.items():
+        stat = path.stat()
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        cached = previous.get(relative)
+        if isinstance(cached, dict) and cached.get("sha256") and all(
+            cached.get(key) == value for key, value in entry.items()
+        ):
+            entry["sha256"] = cached["sha256"]
+        else:
+            to_hash.append(relative)
+        manifest[relative] = entry
+
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+            for relative, digest in zip(to_hash, executor.map(lambda rel: _file_sha256(files[rel]), to_hash)):
+                manifest[relative]["sha256"] = digest
+
+    return manifest
+
+
+def _place_file(source: Path, target: Path) -> bool:
+    """Reemplaza ``target`` de forma atómica; devuelve True si se usó un hardlink."""
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp = target.with_name(f".{target.name}.sync")
+    if temp.exists():
+        temp.unlink()
+
+    linked = False
+    if source.suffix in LINKABLE_SUFFIXES:
+        try:
+            os.link(source, temp)
+            linked = True
+        except OSError:
+            linked = False
+    if not linked:
+        shutil.copy2(source, temp)
+
+    os.replace(temp, target)
+    return linked
+
+
+def _catalog_entries(path: Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    voices = data.get("voices") if isinstance(data, dict) else data
+    if not isinstance(voices, list):
+        return {}
+    return {
+        str(entry.get("id") or entry.get("name") or entry.get("model")): entry
+        for entry in voices
+        if isinstance(entry, dict)
+    }
+
+
+def _changed_voices(
+    previous: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]], changed_files: Set[str]
+) -> List[str]:
+    changed: Set[str] = set(previous) ^ set(current)
+    for voice_id, entry in current.items():
+        if previous.get(voice_id, entry) != entry:
+            changed.add(voice_id)
+        elif str(entry.get("model", "")) in changed_files or str(entry.get("config", "")) in changed_files:
+            changed.add(voice_id)
+    return sorted(changed)
+
+
+def _sync_models_folder() -> SyncReport:
+    """Actualiza ``MODELS_DIR`` copiando sólo los archivos cuyo hash cambió."""
 
     source = REPO_CACHE / "models"
     if not source.exists():
         raise ModelSyncError("No se encontró la carpeta models en el repositorio cacheado")
 
-    if MODELS_DIR.exists():
-        shutil.rmtree(MODELS_DIR)
+    source_manifest = _scan_tree(source, _read_manifest(SOURCE_MANIFEST))
+    _write_manifest(SOURCE_MANIFEST, source_manifest)
 
-    shutil.copytree(source, MODELS_DIR)
-    return MODELS_DIR
+    target_manifest_path = MODELS_DIR / MANIFEST_NAME
+    target_manifest = _scan_tree(MODELS_DIR, _read_manifest(target_manifest_path))
+    previous_catalog = _catalog_entries(MODELS_DIR / "catalog.json")
+
+    report = SyncReport()
+    try:
+        for relative, entry in sorted(source_manifest.items()):
+            current = target_manifest.get(relative)
+            if current is not None and current.get("sha256") == entry["sha256"]:
+                report.unchanged += 1
+                continue
+            if _place_file(source / relative, MODELS_DIR / relative):
+                report.linked += 1
+            (report.updated if current is not None else report.added).append(relative)
+
+        for relative in sorted(set(target_manifest) - set(source_manifest)):
+            (MODELS_DIR / relative).unlink(missing_ok=True)
+            report.removed.append(relative)
+    except OSError as exc:
+        raise ModelSyncError(f"No se pudieron copiar los modelos: {exc}") from exc
+
+    _write_manifest(target_manifest_path, _scan_tree(MODELS_DIR, source_manifest))
+    report.changed_voices = _changed_voices(
+        previous_catalog, _catalog_entries(MODELS_DIR / "catalog.json"), set(report.changed_files)
+    )
+    return report
+
+
+def sync_models(repo_url: str | None = None) -> SyncReport:
+    """Sincroniza los modelos y devuelve el detalle de lo que cambió.
+
+    Lanza ``ModelSyncError`` si no se puede clonar o copiar el repositorio.
+    """
+
+    effective_repo = repo_url or os.environ.get("MODEL_REPO_URL", DEFAULT_REPO)
+    _clone_models_repo(effective_repo)
+    return _sync_models_folder()
 
 
 def sync_models_if_needed(repo_url: str | None = None) -> Tuple[bool, str]:
     """Intenta clonar y copiar los modelos. Devuelve (éxito, mensaje)."""
 
-    effective_repo = repo_url or os.environ.get("MODEL_REPO_URL", DEFAULT_REPO)
     try:
-        _clone_models_repo(effective_repo)
-        _copy_models_folder()
-        return True, "Modelos sincronizados desde el repositorio remoto"
+        report = sync_models(repo_url)
+        return True, report.summary()
     except ModelSyncError as exc:  # pragma: no cover - dependiente de red
         return False, str(exc)
 
@@ -226,7 +422,9 @@ def load_voice_catalog() -> Dict[str, List[Dict[str, str]]]:
 
 __all__ = [
     "load_voice_catalog",
+    "sync_models",
     "sync_models_if_needed",
+    "SyncReport",
     "ModelSyncError",
     "MODELS_DIR",
 ]
@@ -0,0 +1,74 @@
+"""Perfilador por muestreo para inspeccionar la síntesis en producción.
+
+Toma instantáneas periódicas de las pilas de todos los hilos mediante
+``sys._current_frames`` y las agrega en formato "folded" (una pila por línea,
+``marco;marco;marco conteo``), que se puede pasar directamente a
+``flamegraph.pl`` o a speedscope. Por defecto sólo se conservan las pilas que
+atraviesan ``tts_engine.py``, es decir, el camino caliente de la síntesis.
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Dict, List, Optional
+
+ENGINE_FILE = "tts_engine.py"
+MAX_PROFILE_SECONDS = 60.0
+
+
+class ProfilerBusyError(RuntimeError):
+    """Ya hay una captura en curso."""
+
+
+class SamplingProfiler:
+    """Captura muestras de pilas durante una ventana de tiempo acotada."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _folded_stack(frame: Optional[FrameType]) -> List[str]:
+        stack: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def profile(self, seconds: float, *, all_threads: bool = False) -> Dict[str, int]:
+        """Muestrea durante ``seconds`` y devuelve las pilas agregadas con su conteo."""
+
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("Ya hay una captura de perfil en curso")
+
+        samples: Counter[str] = Counter()
+        own_thread = threading.get_ident()
+        deadline = time.monotonic() + max(0.0, min(seconds, MAX_PROFILE_SECONDS))
+        try:
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    stack = self._folded_stack(frame)
+                    if not all_threads and not any(ENGINE_FILE in entry for entry in stack):
+                        continue
+                    samples[";".join(stack)] += 1
+                time.sleep(self.interval)
+        finally:
+            self._lock.release()
+
+        return dict(samples)
+
+    @staticmethod
+    def as_folded(samples: Dict[str, int]) -> str:
+        lines = [f"{stack} {count}" for stack, count in sorted(samples.items())]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+__all__ = ["SamplingProfiler", "ProfilerBusyError", "MAX_PROFILE_SECONDS"]
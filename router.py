@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""Enrutador con afinidad por voz para repartir la síntesis entre varios nodos.
+
+Cada nodo es una instancia de ``app.py``. El enrutador consulta su catálogo en
+``/api/voices`` y su estado en ``/health``, y asigna cada voz a un nodo mediante
+hashing consistente: así cada modelo queda cargado sólo en un subconjunto de
+nodos. Si el nodo asignado no está sano se usa el siguiente del anillo, y al
+sumar un nodo sólo se mueve la fracción de voces que le corresponde.
+
+Todo lo que depende de una voz pasa por el anillo: ``/api/synthesize``,
+``/api/synthesize-template``, ``/api/estimate?voice=`` y el WebSocket
+``/ws/synthesize``, que se reenvía al nodo elegido según la voz de su primer
+mensaje.
+
+Uso::
+
+    python router.py --nodes http://localhost:5001,http://localhost:5002 --port 5100
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import requests
+import simple_websocket
+from flask import Flask, Response, jsonify, request
+from flask_sock import Sock
+
+DEFAULT_REPLICAS = 100
+DEFAULT_CHECK_INTERVAL = 10.0
+DEFAULT_TIMEOUT = 120.0
+HEALTH_TIMEOUT = 3.0
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+def _node_id(url: str) -> str:
+    return hashlib.md5(url.encode("utf-8")).hexdigest()[:8]
+
+
+class HashRing:
+    """Anillo de hashing consistente con réplicas virtuales por nodo."""
+
+    def __init__(self, replicas: int = DEFAULT_REPLICAS) -> None:
+        self.replicas = replicas
+        self._keys: List[int] = []
+        self._owners: List[str] = []
+
+    def rebuild(self, nodes: Iterable[str]) -> None:
+        points = sorted(
+            (_hash(f"{node}#{replica}"), node) for node in nodes for replica in range(self.replicas)
+        )
+        self._keys = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def candidates(self, key: str) -> List[str]:
+        """Nodos distintos en el orden en que se recorren desde ``key``."""
+
+        if not self._keys:
+            return []
+
+        start = bisect.bisect(self._keys, _hash(key))
+        ordered: List[str] = []
+        for offset in range(len(self._keys)):
+            owner = self._owners[(start + offset) % len(self._keys)]
+            if owner not in ordered:
+                ordered.append(owner)
+        return ordered
+
+
+@dataclass
+class Node:
+    url: str
+    healthy: bool = False
+    voices: Set[str] = field(default_factory=set)
+    last_check: float = 0.0
+
+    @property
+    def id(self) -> str:
+        return _node_id(self.url)
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "id": self.id,
+            "url": self.url,
+            "healthy": self.healthy,
+            "voices": sorted(self.voices),
+            "last_check": self.last_check,
+        }
+
+
+class VoiceRouter:
+    """Mantiene el estado de los nodos y elige a cuál enviar cada voz."""
+
+    def __init__(
+        self,
+        nodes: Iterable[str] = (),
+        replicas: int = DEFAULT_REPLICAS,
+        check_interval: float = DEFAULT_CHECK_INTERVAL,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self._ring = HashRing(replicas)
+        self._nodes: Dict[str, Node] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        for url in nodes:
+            self.add_node(url, check=False)
+
+    def add_node(self, url: str, *, check: bool = True) -> Node:
+        url = url.rstrip("/")
+        with self._lock:
+            node = self._nodes.setdefault(url, Node(url=url))
+            self._ring.rebuild(self._nodes)
+        if check:
+            self.check_node(node)
+        return node
+
+    def remove_node(self, url: str) -> bool:
+        with self._lock:
+            removed = self._nodes.pop(url.rstrip("/"), None) is not None
+            self._ring.rebuild(self._nodes)
+        return removed
+
+    def nodes(self) -> List[Node]:
+        with self._lock:
+            return list(self._nodes.values())
+
+    def node_by_id(self, node_id: str) -> Optional[Node]:
+        return next((node for node in self.nodes() if node.id == node_id), None)
+
+    def check_node(self, node: Node) -> None:
+        """Actualiza salud y catálogo de un nodo."""
+
+        try:
+            health = requests.get(f"{node.url}/health", timeout=HEALTH_TIMEOUT)
+            catalog = requests.get(f"{node.url}/api/voices", timeout=HEALTH_TIMEOUT)
+            healthy = health.ok and catalog.ok
+            voices = (
+                {
+                    str(voice.get("id"))
+                    for group in ("male", "female", "other")
+                    for voice in catalog.json().get(group, [])
+                    if isinstance(voice, dict)
+                }
+                if healthy
+                else node.voices
+            )
+        except (requests.RequestException, ValueError):
+            healthy, voices = False, node.voices
+
+        node.healthy = healthy
+        node.voices = voices
+        node.last_check = time.time()
+
+    def check_all(self) -> None:
+        for node in self.nodes():
+            self.check_node(node)
+
+    def mark_unhealthy(self, node: Node) -> None:
+        node.healthy = False
+
+    def route(self, voice_id: str) -> List[Node]:
+        """Nodos sanos que sirven la voz, en orden de preferencia."""
+
+        with self._lock:
+            ordered = [self._nodes[url] for url in self._ring.candidates(voice_id) if url in self._nodes]
+        return [node for node in ordered if node.healthy and voice_id in node.voices]
+
+    def start(self) -> None:
+        """Lanza el chequeo periódico de nodos en segundo plano."""
+
+        def loop() -> None:
+            while not self._stop.is_set():
+                self.check_all()
+                self._stop.wait(self.check_interval)
+
+        threading.Thread(target=loop, name="tts-router-health", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def create_app(router: VoiceRouter) -> Flask:
+    app = Flask(__name__)
+
+    @app.route("/health")
+    def health():
+        healthy = [node for node in router.nodes() if node.healthy]
+        return jsonify({"status": "ok" if healthy else "degraded", "healthy_nodes": len(healthy)})
+
+    @app.route("/api/voices")
+    def voices():
+        """Devuelve el catálogo de un nodo sano (todos comparten catálogo)."""
+
+        for node in router.nodes():
+            if not node.healthy:
+                continue
+            try:
+                upstream = requests.get(f"{node.url}/api/voices", timeout=HEALTH_TIMEOUT)
+            except requests.RequestException:
+                router.mark_unhealthy(node)
+                continue
+            return Response(upstream.content, status=upstream.status_code, mimetype="application/json")
+        return jsonify({"success": False, "error": "No hay nodos disponibles"}), 503
+
+    def forward(voice_id: str, method: str, path: str, **kwargs: object) -> Tuple[Response, int]:
+        """Envía la petición al primer nodo sano de la voz, con failover por el anillo."""
+
+        candidates = router.route(voice_id)
+        if not candidates:
+            return jsonify({"success": False, "error": f"Ningún nodo sano sirve la voz '{voice_id}'"}), 503
+
+        for node in candidates:
+            try:
+                upstream = requests.request(
+                    method, f"{node.url}{path}", params=request.args, timeout=router.timeout, **kwargs
+                )
+            except requests.RequestException:
+                # Nodo caído: pasar al siguiente del anillo.
+                router.mark_unhealthy(node)
+                continue
+            if upstream.status_code == 503:
+                continue
+            return _relay_response(node, upstream)
+
+        return jsonify({"success": False, "error": "Todos los nodos candidatos fallaron"}), 503
+
+    @app.route("/api/synthesize", methods=["POST"])
+    def synthesize():
+        payload = request.get_json(force=True, silent=True) or {}
+        voice_id = str(payload.get("voice") or "").strip()
+        if not voice_id:
+            return jsonify({"success": False, "error": "Debes seleccionar una voz"}), 400
+        return forward(voice_id, "POST", "/api/synthesize", json=payload)
+
+    @app.route("/api/synthesize-template", methods=["POST"])
+    def synthesize_template():
+        payload = request.get_json(force=True, silent=True) or {}
+        voice_id = str(payload.get("voice") or "").strip()
+        if not voice_id:
+            return jsonify({"success": False, "error": "Debes seleccionar una voz"}), 400
+        return forward(voice_id, "POST", "/api/synthesize-template", json=payload)
+
+    @app.route("/api/estimate")
+    def estimate():
+        """Estima en el nodo de la voz; sin ``voice`` junta los modelos de costo de cada nodo."""
+
+        voice_id = str(request.args.get("voice") or "").strip()
+        if voice_id:
+            return forward(voice_id, "GET", "/api/estimate")
+
+        # Cada voz aprende su costo en el nodo que la atiende: se toma el de ese nodo.
+        cost_models: Dict[str, object] = {}
+        for node in router.nodes():
+            if not node.healthy:
+                continue
+            try:
+                upstream = requests.get(f"{node.url}/api/estimate", timeout=HEALTH_TIMEOUT)
+                learned = upstream.json().get("cost_models") or {}
+            except (requests.RequestException, ValueError, AttributeError):
+                continue
+            for voice, model in learned.items():
+                owners = router.route(voice)
+                if voice not in cost_models or (owners and owners[0] is node):
+                    cost_models[voice] = model
+        return jsonify({"success": True, "cost_models": cost_models})
+
+    sock = Sock(app)
+
+    @sock.route("/ws/synthesize")
+    def synthesize_incremental(ws):
+        """Reenvía la sesión al nodo de la voz indicada en el primer mensaje."""
+
+        first = ws.receive()
+        try:
+            voice_id = str(json.loads(first).get("voice") or "").strip()
+        except (TypeError, ValueError, AttributeError):
+            voice_id = ""
+        if not voice_id:
+            ws.send(json.dumps({"type": "error", "error": "Debes seleccionar una voz"}, ensure_ascii=False))
+            return
+
+        upstream = None
+        for node in router.route(voice_id):
+            try:
+                upstream = simple_websocket.Client.connect(f"{_ws_url(node.url)}/ws/synthesize")
+                break
+            except (OSError, simple_websocket.ConnectionError):
+                router.mark_unhealthy(node)
+        if upstream is None:
+            error = f"Ningún nodo sano sirve la voz '{voice_id}'"
+            ws.send(json.dumps({"type": "error", "error": error}, ensure_ascii=False))
+            return
+
+        def client_to_node() -> None:
+            try:
+                while True:
+                    upstream.send(ws.receive())
+            except simple_websocket.ConnectionClosed:
+                # El cliente se fue: cortar también la sesión con el nodo.
+                _close_quietly(upstream)
+
+        threading.Thread(target=client_to_node, name="tts-router-ws", daemon=True).start()
+        try:
+            upstream.send(first)
+            # El nodo cierra tras ``done`` o un error; al volver se cierra también el cliente.
+            while True:
+                ws.send(upstream.receive())
+        except simple_websocket.ConnectionClosed:
+            pass
+        finally:
+            _close_quietly(upstream)
+
+    @app.route("/nodes/<node_id>/outputs/<path:filename>")
+    def node_output(node_id: str, filename: str):
+        node = router.node_by_id(node_id)
+        if node is None:
+            return jsonify({"success": False, "error": "Nodo desconocido"}), 404
+        try:
+            upstream = requests.get(f"{node.url}/outputs/{filename}", timeout=router.timeout, stream=True)
+        except requests.RequestException:
+            router.mark_unhealthy(node)
+            return jsonify({"success": False, "error": "El nodo no está disponible"}), 502
+        return Response(
+            upstream.iter_content(chunk_size=64 * 1024),
+            status=upstream.status_code,
+            content_type=upstream.headers.get("Content-Type", "audio/wav"),
+        )
+
+    @app.route("/router/nodes", methods=["GET", "POST", "DELETE"])
+    def manage_nodes():
+        if request.method == "GET":
+            return jsonify({"nodes": [node.as_dict() for node in router.nodes()]})
+
+        payload = request.get_json(force=True, silent=True) or {}
+        url = str(payload.get("url") or "").strip()
+        if not url:
+            return jsonify({"success": False, "error": "La URL del nodo es obligatoria"}), 400
+        if request.method == "DELETE":
+            return jsonify({"success": router.remove_node(url)})
+        return jsonify({"success": True, "node": router.add_node(url).as_dict()})
+
+    return app
+
+
+def _ws_url(url: str) -> str:
+    return "ws" + url[len("http") :] if url.startswith("http") else url
+
+
+def _close_quietly(ws: simple_websocket.Client) -> None:
+    try:
+        ws.close()
+    except simple_websocket.ConnectionClosed:
+        pass
+
+
+def _relay_response(node: Node, upstream: requests.Response) -> Tuple[Response, int]:
+    """Reenvía la respuesta del nodo apuntando la descarga al proxy del enrutador."""
+
+    try:
+        body = upstream.json()
+    except ValueError:
+        return Response(upstream.content, mimetype="application/json"), upstream.status_code
+
+    download_url = body.get("download_url") if isinstance(body, dict) else None
+    if isinstance(download_url, str) and download_url.startswith("/outputs/"):
+        body["download_url"] = f"/nodes/{node.id}{download_url}"
+
+    response = jsonify(body)
+    response.headers["X-TTS-Node"] = node.url
+    for header in ("Server-Timing", "Retry-After"):
+        if header in upstream.headers:
+            response.headers[header] = upstream.headers[header]
+    return response, upstream.status_code
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Enrutador con afinidad por voz para nodos TTS.")
+    parser.add_argument(
+        "--nodes",
+        default=os.environ.get("TTS_NODES", ""),
+        help="URLs de los nodos separadas por comas (o variable TTS_NODES)",
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--replicas", type=int, default=DEFAULT_REPLICAS, help="Réplicas virtuales por nodo")
+    parser.add_argument("--check-interval", type=float, default=DEFAULT_CHECK_INTERVAL)
+    args = parser.parse_args(argv)
+
+    router = VoiceRouter(
+        [url for url in args.nodes.split(",") if url.strip()],
+        replicas=args.replicas,
+        check_interval=args.check_interval,
+    )
+    router.start()
+    create_app(router).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
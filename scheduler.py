@@ -0,0 +1,242 @@
+"""Planificación de la síntesis según su costo estimado.
+
+El motor procesa una síntesis a la vez. En lugar de atender en el orden en que
+se gana el lock, ``SynthesisScheduler`` decide quién sigue:
+
+* El costo de cada petición se estima con ``CostModel``, una regresión lineal
+  por voz (``segundos = base + por_carácter * caracteres``) que se ajusta en
+  línea con olvido exponencial a partir de los tiempos observados.
+* Entre las peticiones en espera se elige la de mayor *response ratio*
+  ``(espera + estimado) / estimado`` (HRRN): las cortas pasan primero, pero una
+  larga gana prioridad a medida que espera y nunca queda postergada para siempre.
+* Una petición con plazo (``deadline``) que no alcanzaría a cumplirse si se
+  eligiera a otra pasa adelante; si desde el inicio no puede cumplirse, se
+  rechaza de inmediato con ``DeadlineExceededError`` y la espera estimada.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_BASE_SECONDS = 0.05
+DEFAULT_SECONDS_PER_CHAR = 0.004
+
+
+class DeadlineExceededError(RuntimeError):
+    """La petición no puede completarse antes de su plazo."""
+
+    def __init__(self, message: str, estimated_seconds: float) -> None:
+        super().__init__(message)
+        self.estimated_seconds = estimated_seconds
+
+
+class CostModel:
+    """Regresión lineal por voz con olvido exponencial de observaciones viejas."""
+
+    def __init__(
+        self,
+        decay: float = 0.95,
+        base_seconds: float = DEFAULT_BASE_SECONDS,
+        seconds_per_char: float = DEFAULT_SECONDS_PER_CHAR,
+        prior_weight: float = 2.0,
+    ) -> None:
+        self.decay = decay
+        self.base_seconds = base_seconds
+        self.seconds_per_char = seconds_per_char
+        self.prior_weight = prior_weight
+        # Por voz: [peso, Σx, Σy, Σx², Σxy]
+        self._stats: Dict[str, List[float]] = {}
+        self._samples: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _prior(self) -> List[float]:
+        # Dos puntos ficticios sobre la recta por defecto para arrancar sin datos.
+        stats = [0.0] * 5
+        for chars in (20.0, 200.0):
+            seconds = self.base_seconds + self.seconds_per_char * chars
+            self._accumulate(stats, chars, seconds, self.prior_weight / 2)
+        return stats
+
+    @staticmethod
+    def _accumulate(stats: List[float], x: float, y: float, weight: float = 1.0) -> None:
+        stats[0] += weight
+        stats[1] += weight * x
+        stats[2] += weight * y
+        stats[3] += weight * x * x
+        stats[4] += weight * x * y
+
+    def observe(self, voice_id: str, chars: int, seconds: float) -> None:
+        if chars <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            stats = self._stats.setdefault(voice_id, self._prior())
+            for index in range(5):
+                stats[index] *= self.decay
+            self._accumulate(stats, float(chars), seconds)
+            self._samples[voice_id] = self._samples.get(voice_id, 0) + 1
+
+    def params(self, voice_id: str) -> Tuple[float, float]:
+        """Devuelve ``(base, por_carácter)`` en segundos para la voz."""
+
+        with self._lock:
+            stats = self._stats.get(voice_id)
+            if stats is None:
+                return self.base_seconds, self.seconds_per_char
+            weight, sx, sy, sxx, sxy = stats
+
+        denominator = weight * sxx - sx * sx
+        if weight <= 0 or denominator <= 1e-12:
+            return self.base_seconds, self.seconds_per_char
+
+        slope = max(0.0, (weight * sxy - sx * sy) / denominator)
+        base = max(0.0, (sy - slope * sx) / weight)
+        return base, slope
+
+    def estimate(self, voice_id: str, chars: int) -> float:
+        base, per_char = self.params(voice_id)
+        return base + per_char * max(0, chars)
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            voices = list(self._stats)
+        summary: Dict[str, Dict[str, float]] = {}
+        for voice_id in voices:
+            base, per_char = self.params(voice_id)
+            summary[voice_id] = {
+                "base_ms": round(base * 1000.0, 3),
+                "per_char_ms": round(per_char * 1000.0, 4),
+                "samples": self._samples.get(voice_id, 0),
+            }
+        return summary
+
+
+@dataclass(eq=False)
+class Ticket:
+    voice_id: str
+    chars: int
+    estimate: float
+    deadline: Optional[float]
+    enqueued: float = field(default_factory=time.monotonic)
+    started: Optional[float] = None
+    work_started: Optional[float] = None
+    failed: bool = False
+
+    def mark_work(self) -> None:
+        """Marca el inicio del trabajo medible (tras cargar el modelo)."""
+
+        self.work_started = time.monotonic()
+
+
+class SynthesisScheduler:
+    """Otorga el turno de síntesis priorizando trabajos cortos y con plazo."""
+
+    def __init__(self, cost_model: Optional[CostModel] = None) -> None:
+        self.cost_model = cost_model or CostModel()
+        self._cond = threading.Condition()
+        self._queue: List[Ticket] = []
+        self._running: Optional[Ticket] = None
+
+    def _remaining_running(self, now: float) -> float:
+        running = self._running
+        if running is None or running.started is None:
+            return 0.0
+        return max(0.0, running.estimate - (now - running.started))
+
+    def _expected_wait(self, estimate: float, now: float) -> float:
+        ahead = sum(ticket.estimate for ticket in self._queue if ticket.estimate <= estimate)
+        return self._remaining_running(now) + ahead
+
+    def _pick(self, now: float) -> Optional[Ticket]:
+        if not self._queue:
+            return None
+
+        chosen = max(
+            self._queue,
+            key=lambda ticket: (now - ticket.enqueued + ticket.estimate) / max(ticket.estimate, 1e-3),
+        )
+        urgent = [
+            ticket
+            for ticket in self._queue
+            if ticket is not chosen
+            and ticket.deadline is not None
+            and ticket.deadline - now - ticket.estimate < chosen.estimate
+        ]
+        if urgent:
+            return min(urgent, key=lambda ticket: ticket.deadline or 0.0)
+        return chosen
+
+    def estimate(self, voice_id: str, chars: int) -> Dict[str, float]:
+        estimate = self.cost_model.estimate(voice_id, chars)
+        with self._cond:
+            wait = self._expected_wait(estimate, time.monotonic())
+            queued = len(self._queue)
+        return {
+            "estimated_ms": round(estimate * 1000.0, 3),
+            "estimated_wait_ms": round(wait * 1000.0, 3),
+            "queue_length": queued,
+        }
+
+    def acquire(self, voice_id: str, chars: int, deadline: Optional[float] = None) -> Ticket:
+        """Bloquea hasta que sea el turno de la petición; ``deadline`` es ``time.monotonic()``."""
+
+        if deadline is not None and not math.isfinite(deadline):
+            raise ValueError("El plazo debe ser un número finito")
+
+        ticket = Ticket(voice_id, chars, self.cost_model.estimate(voice_id, chars), deadline)
+        with self._cond:
+            now = time.monotonic()
+            if deadline is not None:
+                expected = self._expected_wait(ticket.estimate, now) + ticket.estimate
+                if now + expected > deadline:
+                    raise DeadlineExceededError(
+                        "La petición no puede completarse dentro del plazo solicitado", expected
+                    )
+
+            self._queue.append(ticket)
+            self._dispatch()
+            try:
+                while self._running is not ticket:
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise DeadlineExceededError(
+                            "El plazo de la petición venció mientras esperaba su turno",
+                            self._expected_wait(ticket.estimate, time.monotonic()) + ticket.estimate,
+                        )
+                    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    self._cond.wait(timeout=timeout)
+            except BaseException:
+                # Sin esto un ticket huérfano podría recibir el turno y nadie lo liberaría.
+                if self._running is ticket:
+                    self._running = None
+                elif ticket in self._queue:
+                    self._queue.remove(ticket)
+                self._dispatch()
+                raise
+        return ticket
+
+    def _dispatch(self) -> None:
+        """Si el motor está libre, asigna el turno a la siguiente petición (con el lock tomado)."""
+
+        if self._running is not None:
+            return
+        now = time.monotonic()
+        ticket = self._pick(now)
+        if ticket is None:
+            return
+        self._queue.remove(ticket)
+        ticket.started = now
+        self._running = ticket
+        self._cond.notify_all()
+
+    def release(self, ticket: Ticket) -> None:
+        if not ticket.failed and ticket.work_started is not None:
+            self.cost_model.observe(ticket.voice_id, ticket.chars, time.monotonic() - ticket.work_started)
+        with self._cond:
+            if self._running is ticket:
+                self._running = None
+            self._dispatch()
+
+
+__all__ = ["CostModel", "SynthesisScheduler", "DeadlineExceededError", "Ticket"]
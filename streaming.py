@@ -0,0 +1,170 @@
+"""Síntesis incremental para texto que llega por partes (por ejemplo, salida de un LLM).
+
+El cliente abre un WebSocket y envía mensajes JSON:
+
+1. ``{"voice": "...", "speed": 1.0, "output_profile": "native"}`` para iniciar.
+2. ``{"text": "..."}`` con cada fragmento de texto a medida que se genera.
+3. ``{"end": true}`` para indicar que no llegará más texto.
+
+Cada oración completa se sintetiza apenas se detecta, mientras se siguen
+recibiendo fragmentos. Por cada oración el servidor envía un mensaje JSON
+``{"type": "audio", ...}`` con los metadatos, seguido de un mensaje binario con
+el audio crudo (PCM 16 bits little-endian o μ-law según el perfil). Al terminar
+envía ``{"type": "done"}``; los errores se informan con ``{"type": "error"}``.
+"""
+from __future__ import annotations
+
+import json
+import queue
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from tts_engine import DEFAULT_OUTPUT_PROFILE, OUTPUT_PROFILES, SynthesisError, TTSEngine, VoiceNotFoundError
+
+# Fin de oración: puntuación final seguida de espacio, o salto de línea.
+_SENTENCE_END = re.compile(r"(?<=[.!?…;:])\s+|\n+")
+MIN_SENTENCE_CHARS = 12
+
+
+class SentenceBuffer:
+    """Acumula texto incremental y entrega las oraciones ya completas."""
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS) -> None:
+        self.min_chars = min_chars
+        self._pending = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._pending += text
+        sentences: List[str] = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._pending):
+            candidate = self._pending[start : match.start()].strip()
+            # Oraciones muy cortas ("Sr.", "1.") se unen con la siguiente.
+            if len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self._pending = self._pending[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        remainder = self._pending.strip()
+        self._pending = ""
+        return remainder or None
+
+
+class _ClientError(ValueError):
+    pass
+
+
+def _parse_message(raw: Any) -> Dict[str, Any]:
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8", errors="replace")
+    try:
+        message = json.loads(raw)
+    except (TypeError, json.JSONDecodeError) as exc:
+        raise _ClientError("El mensaje no es un JSON válido") from exc
+    if not isinstance(message, dict):
+        raise _ClientError("Se esperaba un objeto JSON")
+    return message
+
+
+def serve_incremental_synthesis(ws: Any, engine: TTSEngine) -> None:
+    """Atiende una conexión WebSocket de síntesis incremental hasta su cierre."""
+
+    try:
+        start = _parse_message(ws.receive())
+        voice_id = str(start.get("voice") or "").strip()
+        speed = float(start.get("speed") or 1.0)
+        output_profile = str(start.get("output_profile") or "").strip() or None
+        if not voice_id:
+            raise _ClientError("Debes seleccionar una voz")
+        if output_profile and output_profile not in OUTPUT_PROFILES:
+            raise _ClientError(f"Perfil de salida '{output_profile}' no soportado")
+        if voice_id not in engine.voices:
+            raise _ClientError(f"Voz '{voice_id}' no está configurada")
+    except (_ClientError, TypeError, ValueError) as exc:
+        ws.send(json.dumps({"type": "error", "error": str(exc)}, ensure_ascii=False))
+        return
+
+    profile = OUTPUT_PROFILES.get(output_profile or DEFAULT_OUTPUT_PROFILE)
+    sentences: "queue.Queue[Optional[str]]" = queue.Queue()
+    failed = threading.Event()
+    # ``ws.send`` no es seguro entre hilos: el worker y el hilo principal envían.
+    send_lock = threading.Lock()
+
+    def send(payload: Any) -> None:
+        try:
+            with send_lock:
+                ws.send(payload)
+        except Exception:  # pragma: no cover - el cliente cerró la conexión
+            failed.set()
+
+    def synthesize_worker() -> None:
+        index = 0
+        while True:
+            sentence = sentences.get()
+            if sentence is None or failed.is_set():
+                return
+            try:
+                audio, sample_rate = engine.synthesize_raw(sentence, voice_id, speed, output_profile)
+            except (SynthesisError, VoiceNotFoundError) as exc:
+                send(json.dumps({"type": "error", "error": str(exc)}, ensure_ascii=False))
+                failed.set()
+                return
+            except Exception as exc:  # p. ej. errores de ONNX Runtime, que no son RuntimeError
+                send(json.dumps({"type": "error", "error": f"Error al sintetizar: {exc}"}, ensure_ascii=False))
+                failed.set()
+                return
+
+            send(
+                json.dumps(
+                    {
+                        "type": "audio",
+                        "index": index,
+                        "text": sentence,
+                        "sample_rate": sample_rate,
+                        "encoding": "mulaw" if profile and profile.subtype == "ULAW" else "pcm_s16le",
+                        "bytes": len(audio),
+                    },
+                    ensure_ascii=False,
+                )
+            )
+            send(audio)
+            index += 1
+
+    worker = threading.Thread(target=synthesize_worker, name="tts-incremental", daemon=True)
+    worker.start()
+    buffer = SentenceBuffer()
+    finished = False
+
+    try:
+        while not failed.is_set():
+            try:
+                message = _parse_message(ws.receive())
+            except _ClientError as exc:
+                send(json.dumps({"type": "error", "error": str(exc)}, ensure_ascii=False))
+                failed.set()
+                break
+
+            for sentence in buffer.feed(str(message.get("text") or "")):
+                sentences.put(sentence)
+            if message.get("end"):
+                finished = True
+                break
+    finally:
+        if not finished:
+            # Conexión cerrada o error: descartar lo que quede en cola.
+            failed.set()
+        remainder = buffer.flush()
+        if remainder and not failed.is_set():
+            sentences.put(remainder)
+        sentences.put(None)
+        worker.join()
+
+    if not failed.is_set():
+        send(json.dumps({"type": "done"}))
+
+
+__all__ = ["SentenceBuffer", "serve_incremental_synthesis"]
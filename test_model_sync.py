@@ -0,0 +1,129 @@
+"""Sincronización incremental contra un repositorio git *bare* local."""
+from __future__ import annotations
+
+import json
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+import model_sync
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git no está instalado")
+
+
+def _git(*args: str, cwd: Path) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+def _catalog(*voices: str) -> str:
+    entries = [
+        {"id": voice, "name": voice, "gender": "female", "model": f"{voice}.onnx", "config": f"{voice}.onnx.json"}
+        for voice in voices
+    ]
+    return json.dumps({"voices": entries})
+
+
+def _publish(work: Path, files: Dict[str, str | None]) -> None:
+    """Escribe (o borra, con ``None``) archivos de ``models/`` y los empuja a ``main``."""
+
+    for relative, content in files.items():
+        path = work / "models" / relative
+        if content is None:
+            path.unlink()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content, encoding="utf-8")
+    _git("add", "-A", cwd=work)
+    _git("commit", "-m", "update", cwd=work)
+    _git("push", "origin", "HEAD:main", cwd=work)
+
+
+@pytest.fixture
+def remote(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    bare = tmp_path / "remote.git"
+    work = tmp_path / "work"
+    _git("init", "--bare", "--initial-branch=main", str(bare), cwd=tmp_path)
+    _git("clone", str(bare), str(work), cwd=tmp_path)
+    _git("checkout", "-b", "main", cwd=work)
+
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(model_sync, "MODELS_DIR", tmp_path / "models")
+    monkeypatch.setattr(model_sync, "CACHE_DIR", cache_dir)
+    monkeypatch.setattr(model_sync, "REPO_CACHE", cache_dir / "tts-piper-2")
+    monkeypatch.setattr(model_sync, "SOURCE_MANIFEST", cache_dir / "models_manifest.json")
+
+    _publish(
+        work,
+        {
+            "catalog.json": _catalog("a", "b", "c"),
+            "a.onnx": "AAAA",
+            "a.onnx.json": "{}",
+            "b.onnx": "BBBB",
+            "b.onnx.json": "{}",
+            "c.onnx": "CCCC",
+            "c.onnx.json": "{}",
+        },
+    )
+    return work
+
+
+def test_initial_sync_adds_everything(remote: Path, tmp_path: Path) -> None:
+    report = model_sync.sync_models(str(tmp_path / "remote.git"))
+
+    assert report.added == sorted(
+        ["a.onnx", "a.onnx.json", "b.onnx", "b.onnx.json", "c.onnx", "c.onnx.json", "catalog.json"]
+    )
+    assert report.updated == [] and report.removed == []
+    assert report.changed_voices == ["a", "b", "c"]
+    assert (model_sync.MODELS_DIR / "b.onnx").read_text() == "BBBB"
+
+
+def test_incremental_sync_reports_only_changes(remote: Path, tmp_path: Path) -> None:
+    repo_url = str(tmp_path / "remote.git")
+    model_sync.sync_models(repo_url)
+    _publish(
+        remote,
+        {
+            "catalog.json": _catalog("a", "b", "d"),
+            "b.onnx": "BBBB-v2",
+            "c.onnx": None,
+            "c.onnx.json": None,
+            "d.onnx": "DDDD",
+            "d.onnx.json": "{}",
+        },
+    )
+
+    report = model_sync.sync_models(repo_url)
+
+    assert report.added == ["d.onnx", "d.onnx.json"]
+    assert report.updated == ["b.onnx", "catalog.json"]
+    assert report.removed == ["c.onnx", "c.onnx.json"]
+    assert report.unchanged == 3
+    assert report.changed_voices == ["b", "c", "d"]
+    assert not (model_sync.MODELS_DIR / "c.onnx").exists()
+
+    again = model_sync.sync_models(repo_url)
+    assert again.changed_files == [] and again.changed_voices == []
+
+
+def test_sync_repairs_model_damaged_in_place(remote: Path, tmp_path: Path) -> None:
+    repo_url = str(tmp_path / "remote.git")
+    model_sync.sync_models(repo_url)
+
+    # Escritura en sitio: con hardlink también alcanza a la copia cacheada.
+    with (model_sync.MODELS_DIR / "a.onnx").open("r+b") as handle:
+        handle.write(b"XX")
+
+    report = model_sync.sync_models(repo_url)
+
+    assert report.updated == ["a.onnx"]
+    assert report.changed_voices == ["a"]
+    assert (model_sync.MODELS_DIR / "a.onnx").read_text() == "AAAA"
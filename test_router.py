@@ -0,0 +1,135 @@
+"""Afinidad, failover y respuestas 429 del enrutador contra dos nodos de prueba."""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List
+
+import pytest
+from flask import Flask, jsonify, request
+from werkzeug.serving import BaseWSGIServer, make_server
+
+from router import VoiceRouter, create_app
+
+VOICES = ["es-ar-daniela-high", "es-es-davefx-high", "es-mx-ald-medium", "es-es-carlfm-xlow"]
+
+
+@dataclass
+class StubNode:
+    """Nodo mínimo que imita la API de ``app.py`` y anota qué voces atendió."""
+
+    server: BaseWSGIServer
+    served: List[str] = field(default_factory=list)
+    status: int = 200
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _stub_node() -> StubNode:
+    app = Flask(__name__)
+    node: Dict[str, StubNode] = {}
+
+    @app.route("/health")
+    def health():
+        return jsonify({"status": "ok"})
+
+    @app.route("/api/voices")
+    def voices():
+        return jsonify({"male": [], "female": [{"id": voice} for voice in VOICES], "other": []})
+
+    @app.route("/api/synthesize", methods=["POST"])
+    def synthesize():
+        stub = node["self"]
+        stub.served.append(str((request.get_json() or {}).get("voice")))
+        if stub.status == 429:
+            response = jsonify({"success": False, "error": "Plazo inalcanzable", "estimated_ms": 900.0})
+            response.headers["Retry-After"] = "1"
+            return response, 429
+        return jsonify({"success": True, "download_url": "/outputs/audio.wav"})
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    node["self"] = StubNode(server)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return node["self"]
+
+
+@pytest.fixture
+def cluster() -> Iterator[Dict[str, StubNode]]:
+    nodes = [_stub_node(), _stub_node()]
+    yield {node.url: node for node in nodes}
+    for node in nodes:
+        try:
+            node.stop()
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def voice_router(cluster: Dict[str, StubNode]) -> VoiceRouter:
+    voice_router = VoiceRouter(list(cluster), timeout=5.0)
+    voice_router.check_all()
+    return voice_router
+
+
+def _synthesize(voice_router: VoiceRouter, voice: str):
+    client = create_app(voice_router).test_client()
+    return client.post("/api/synthesize", json={"text": "Hola", "voice": voice})
+
+
+def test_same_voice_always_goes_to_the_same_node(
+    voice_router: VoiceRouter, cluster: Dict[str, StubNode]
+) -> None:
+    owners = {}
+    for voice in VOICES:
+        for _ in range(3):
+            response = _synthesize(voice_router, voice)
+            assert response.status_code == 200
+            owners.setdefault(voice, set()).add(response.headers["X-TTS-Node"])
+
+    assert all(len(nodes) == 1 for nodes in owners.values())
+    assert {voice: nodes.pop() for voice, nodes in owners.items()} == {
+        voice: voice_router.route(voice)[0].url for voice in VOICES
+    }
+    # La descarga se reescribe hacia el proxy del nodo que sintetizó.
+    assert _synthesize(voice_router, VOICES[0]).get_json()["download_url"].startswith("/nodes/")
+
+
+def test_fails_over_to_next_node_on_the_ring(voice_router: VoiceRouter, cluster: Dict[str, StubNode]) -> None:
+    voice = VOICES[0]
+    primary, secondary = voice_router.route(voice)
+    cluster[primary.url].stop()
+
+    response = _synthesize(voice_router, voice)
+
+    assert response.status_code == 200
+    assert response.headers["X-TTS-Node"] == secondary.url
+    assert not primary.healthy
+    assert voice_router.route(voice) == [secondary]
+    assert cluster[secondary.url].served == [voice]
+
+
+def test_429_is_passed_through_without_retrying(
+    voice_router: VoiceRouter, cluster: Dict[str, StubNode]
+) -> None:
+    voice = VOICES[0]
+    primary, secondary = voice_router.route(voice)
+    cluster[primary.url].status = 429
+
+    response = _synthesize(voice_router, voice)
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert response.get_json()["estimated_ms"] == 900.0
+    assert cluster[primary.url].served == [voice]
+    assert cluster[secondary.url].served == []
+    assert primary.healthy
+
+
+def test_unknown_voice_is_not_routed(voice_router: VoiceRouter) -> None:
+    assert _synthesize(voice_router, "no-existe").status_code == 503
@@ -0,0 +1,159 @@
+"""Orden HRRN, plazos y limpieza de turnos del planificador de síntesis."""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Callable, List
+
+import pytest
+
+from scheduler import DeadlineExceededError, SynthesisScheduler, Ticket
+
+SHORT = 10
+LONG = 1000
+
+
+def _wait_until(condition: Callable[[], bool], timeout: float = 2.0) -> None:
+    limit = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < limit, "el planificador no llegó al estado esperado"
+        time.sleep(0.005)
+
+
+def _queued(scheduler: SynthesisScheduler) -> int:
+    with scheduler._cond:
+        return len(scheduler._queue)
+
+
+def _start(target: Callable[[], None], name: str = "tts-test") -> threading.Thread:
+    thread = threading.Thread(target=target, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_short_request_goes_before_a_long_one_queued_earlier() -> None:
+    scheduler = SynthesisScheduler()
+    holder = scheduler.acquire("voz", SHORT)
+    order: List[int] = []
+
+    def run(chars: int) -> None:
+        ticket = scheduler.acquire("voz", chars)
+        order.append(chars)
+        scheduler.release(ticket)
+
+    threads = [_start(lambda: run(LONG))]
+    _wait_until(lambda: _queued(scheduler) == 1)
+    threads.append(_start(lambda: run(SHORT)))
+    _wait_until(lambda: _queued(scheduler) == 2)
+
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join(timeout=2.0)
+
+    assert order == [SHORT, LONG]
+
+
+def test_long_request_is_not_starved_by_fresh_short_ones() -> None:
+    scheduler = SynthesisScheduler()
+    now = time.monotonic()
+    long_ticket = Ticket("voz", LONG, estimate=1.0, deadline=None, enqueued=now - 5.0)
+    short_ticket = Ticket("voz", SHORT, estimate=0.01, deadline=None, enqueued=now - 0.02)
+    scheduler._queue = [short_ticket, long_ticket]
+
+    # Ratio de la larga: (5 + 1) / 1 = 6; de la corta: (0.02 + 0.01) / 0.01 = 3.
+    assert scheduler._pick(now) is long_ticket
+
+
+def test_unreachable_deadline_is_rejected_with_estimate() -> None:
+    scheduler = SynthesisScheduler()
+    holder = scheduler.acquire("voz", LONG)
+
+    with pytest.raises(DeadlineExceededError) as excinfo:
+        scheduler.acquire("voz", SHORT, deadline=time.monotonic() + 0.01)
+
+    own = scheduler.cost_model.estimate("voz", SHORT)
+    # La espera estimada incluye lo que le queda a la síntesis en curso.
+    assert excinfo.value.estimated_seconds > own + 0.5 * holder.estimate
+    assert _queued(scheduler) == 0
+    scheduler.release(holder)
+
+
+def test_deadline_expired_while_waiting_removes_ticket_and_dispatches_next() -> None:
+    scheduler = SynthesisScheduler()
+    holder = scheduler.acquire("voz", SHORT)
+    errors: List[BaseException] = []
+    served: List[Ticket] = []
+
+    def impatient() -> None:
+        try:
+            scheduler.acquire("voz", SHORT, deadline=time.monotonic() + 0.3)
+        except DeadlineExceededError as exc:
+            errors.append(exc)
+
+    def patient() -> None:
+        ticket = scheduler.acquire("voz", SHORT)
+        served.append(ticket)
+        scheduler.release(ticket)
+
+    first = _start(impatient)
+    _wait_until(lambda: _queued(scheduler) == 1)
+    second = _start(patient)
+    first.join(timeout=2.0)
+
+    assert len(errors) == 1
+    assert _queued(scheduler) == 1
+
+    scheduler.release(holder)
+    second.join(timeout=2.0)
+    assert len(served) == 1
+    assert _queued(scheduler) == 0 and scheduler._running is None
+
+
+def test_ticket_interrupted_after_getting_its_turn_hands_it_over() -> None:
+    class InterruptingCondition(threading.Condition):
+        def wait(self, timeout: float | None = None) -> bool:
+            woke = super().wait(timeout)
+            if threading.current_thread().name == "interrumpido":
+                raise RuntimeError("espera interrumpida")
+            return woke
+
+    scheduler = SynthesisScheduler()
+    scheduler._cond = InterruptingCondition()
+    holder = scheduler.acquire("voz", SHORT)
+    errors: List[BaseException] = []
+    served: List[Ticket] = []
+
+    def interrupted() -> None:
+        try:
+            scheduler.acquire("voz", SHORT)
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    def patient() -> None:
+        served.append(scheduler.acquire("voz", LONG))
+
+    first = _start(interrupted, name="interrumpido")
+    _wait_until(lambda: _queued(scheduler) == 1)
+    second = _start(patient)
+    _wait_until(lambda: _queued(scheduler) == 2)
+
+    # La corta recibe el turno y su espera falla: el turno debe pasar a la otra.
+    scheduler.release(holder)
+    first.join(timeout=2.0)
+    second.join(timeout=2.0)
+
+    assert len(errors) == 1
+    assert len(served) == 1 and scheduler._running is served[0]
+    scheduler.release(served[0])
+    assert scheduler._running is None and _queued(scheduler) == 0
+
+
+@pytest.mark.parametrize("deadline", [math.inf, -math.inf, math.nan])
+def test_non_finite_deadline_is_rejected(deadline: float) -> None:
+    scheduler = SynthesisScheduler()
+
+    with pytest.raises(ValueError):
+        scheduler.acquire("voz", SHORT, deadline=deadline)
+
+    assert _queued(scheduler) == 0 and scheduler._running is None
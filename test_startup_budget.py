@@ -0,0 +1,64 @@
+"""Presupuesto de arranque en frío y de memoria privada por modelo cargado."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+import startup_budget
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="usa /proc/self/smaps_rollup")
+
+
+def _matmul_model(path: Path) -> Path:
+    """Modelo chico con pesos de ``MatMul``, los que el prepacking copia al heap."""
+
+    np = pytest.importorskip("numpy")
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+
+    rng = np.random.default_rng(0)
+    weights = [numpy_helper.from_array(rng.random((512, 512), dtype=np.float32), f"W{i}") for i in range(4)]
+    nodes = [helper.make_node("MatMul", ["x" if i == 0 else f"h{i - 1}", f"W{i}"], [f"h{i}"]) for i in range(4)]
+    graph = helper.make_graph(
+        nodes,
+        "budget",
+        [helper.make_tensor_value_info("x", TensorProto.FLOAT, [1, None, 512])],
+        [helper.make_tensor_value_info("h3", TensorProto.FLOAT, None)],
+        initializer=weights,
+    )
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)]), path)
+    return path
+
+
+@pytest.mark.parametrize("module", startup_budget.DEFAULT_MODULES)
+def test_startup_within_budget(module: str) -> None:
+    result = startup_budget.measure(module)
+
+    assert startup_budget.check(result) == []
+
+
+@linux_only
+def test_loaded_model_weights_stay_shared_without_prepacking(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    model = _matmul_model(tmp_path / "model.onnx")
+    monkeypatch.setenv("TTS_MMAP_DIR", str(tmp_path / "mmap"))
+    monkeypatch.delenv("TTS_MMAP_MODELS", raising=False)
+    monkeypatch.setenv("TTS_MMAP_PREPACK", "0")
+
+    result = startup_budget.measure("tts_engine", model=model, repeat=1)
+
+    assert result["weights_kb"] >= 4 * 1024 and result["mapped_weights"]
+    assert startup_budget.check(result) == []
+
+
+@linux_only
+def test_budget_detects_weights_copied_by_prepacking(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    model = _matmul_model(tmp_path / "model.onnx")
+    monkeypatch.setenv("TTS_MMAP_DIR", str(tmp_path / "mmap"))
+    # Valor por defecto: el prepacking está activo.
+    monkeypatch.delenv("TTS_MMAP_PREPACK", raising=False)
+
+    result = startup_budget.measure("tts_engine", model=model, repeat=1)
+
+    assert any("memoria privada" in failure for failure in startup_budget.check(result))
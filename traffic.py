@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""Captura de tráfico real de ``/api/synthesize`` y reproducción determinista.
+
+La captura se activa con ``TTS_CAPTURE_PATH`` y agrega una línea JSONL por
+petición con la hora de llegada, la voz, la velocidad, la latencia y el tamaño
+del resultado. Por privacidad el texto se guarda como hash más su largo, salvo
+que ``TTS_CAPTURE_TEXT=full``. ``TTS_CAPTURE_SAMPLE`` fija la fracción de
+peticiones registradas y ``TTS_CAPTURE_MAX_BYTES`` el tamaño a partir del cual
+se rota el archivo (se conservan ``TTS_CAPTURE_BACKUPS`` copias).
+
+La reproducción envía las peticiones capturadas a una instancia respetando los
+intervalos originales entre llegadas (a 1x o acelerados) e informa percentiles
+de latencia y throughput::
+
+    python traffic.py captura.jsonl --target http://localhost:5000 --speed 4
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+FILLER_TEXT = (
+    "Este es un texto de relleno para reproducir tráfico con la misma longitud que la petición original. "
+)
+
+
+def _env_number(
+    name: str, default: str, cast: Callable[[str], float], minimum: float, maximum: float = math.inf
+) -> Any:
+    raw = os.environ.get(name, "").strip() or default
+    try:
+        value = cast(raw)
+    except ValueError:
+        value = math.nan
+    if not math.isfinite(value) or not minimum <= value <= maximum:
+        expected = f"entre {minimum:g} y {maximum:g}" if math.isfinite(maximum) else f"mayor o igual a {minimum:g}"
+        kind = "un entero" if cast is int else "un número"
+        raise RuntimeError(f"{name}='{raw}' no es válido (se espera {kind} {expected})")
+    return value
+
+
+class TrafficRecorder:
+    """Agrega registros JSONL compactos con muestreo y rotación por tamaño."""
+
+    def __init__(
+        self,
+        path: Path,
+        sample_rate: float = 1.0,
+        max_bytes: int = 50 * 1024 * 1024,
+        backups: int = 5,
+        store_text: bool = False,
+    ) -> None:
+        self.path = path
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.store_text = store_text
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["TrafficRecorder"]:
+        """Crea el registrador si ``TTS_CAPTURE_PATH`` está definido.
+
+        Un valor inválido en las variables ``TTS_CAPTURE_*`` detiene el
+        arranque con ``RuntimeError``, igual que ``TTS_OUTPUT_PROFILE``: la
+        captura pedida no debe desactivarse en silencio.
+        """
+
+        raw_path = os.environ.get("TTS_CAPTURE_PATH", "").strip()
+        if not raw_path:
+            return None
+
+        text_mode = os.environ.get("TTS_CAPTURE_TEXT", "").strip().lower() or "hash"
+        if text_mode not in {"hash", "full"}:
+            raise RuntimeError(f"TTS_CAPTURE_TEXT='{text_mode}' no es válido (opciones: hash, full)")
+        sample_rate = _env_number("TTS_CAPTURE_SAMPLE", "1.0", float, 0.0, 1.0)
+        max_bytes = _env_number("TTS_CAPTURE_MAX_BYTES", str(50 * 1024 * 1024), int, 1)
+        backups = _env_number("TTS_CAPTURE_BACKUPS", "5", int, 0)
+
+        try:
+            return cls(
+                Path(raw_path),
+                sample_rate=sample_rate,
+                max_bytes=max_bytes,
+                backups=backups,
+                store_text=text_mode == "full",
+            )
+        except OSError as exc:
+            raise RuntimeError(f"No se pudo preparar la captura en TTS_CAPTURE_PATH='{raw_path}': {exc}") from exc
+
+    def should_sample(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def record(
+        self,
+        *,
+        arrival: float,
+        text: str,
+        voice: str,
+        speed: float,
+        output_profile: Optional[str],
+        latency_ms: float,
+        status: int,
+        result_bytes: int,
+    ) -> None:
+        entry: Dict[str, Any] = {
+            "ts": round(arrival, 6),
+            "voice": voice,
+            "speed": speed,
+            "output_profile": output_profile,
+            "chars": len(text),
+            "latency_ms": round(latency_ms, 3),
+            "status": status,
+            "bytes": result_bytes,
+        }
+        if self.store_text:
+            entry["text"] = text
+        else:
+            entry["text_sha256"] = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            try:
+                self._rotate_if_needed()
+                with self.path.open("a", encoding="utf-8") as handle:
+                    handle.write(line)
+            except OSError:
+                # La captura nunca debe afectar la respuesta al cliente.
+                pass
+
+    def _rotate_if_needed(self) -> None:
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            return
+        if size < self.max_bytes:
+            return
+
+        for index in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{index}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+
+def load_capture(paths: List[Path]) -> List[Dict[str, Any]]:
+    """Lee uno o más archivos de captura y los ordena por hora de llegada."""
+
+    records: List[Dict[str, Any]] = []
+    for path in paths:
+        with path.open(encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(entry, dict) and "ts" in entry and entry.get("voice"):
+                    records.append(entry)
+    records.sort(key=lambda entry: float(entry["ts"]))
+    return records
+
+
+def _replay_text(entry: Dict[str, Any]) -> str:
+    text = entry.get("text")
+    if isinstance(text, str) and text.strip():
+        return text
+    chars = max(1, int(entry.get("chars") or len(FILLER_TEXT)))
+    return (FILLER_TEXT * (chars // len(FILLER_TEXT) + 1))[:chars].strip() or "Hola"
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percent / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def replay(
+    records: List[Dict[str, Any]],
+    target: str,
+    speed: float = 1.0,
+    max_workers: int = 64,
+    timeout: float = 300.0,
+) -> Dict[str, Any]:
+    """Reproduce la captura contra ``target`` con los intervalos originales / ``speed``."""
+
+    if not records:
+        return {"requests": 0}
+
+    # Sólo la reproducción usa ``requests``; el servidor importa este módulo para capturar.
+    import requests
+
+    url = target.rstrip("/") + "/api/synthesize"
+    first_arrival = float(records[0]["ts"])
+    # ``requests.Session`` no es seguro entre hilos: una por hilo del pool, que
+    # igual reutiliza sus conexiones entre peticiones.
+    local = threading.local()
+    sessions: List[Any] = []
+
+    def session() -> Any:
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+            sessions.append(local.session)
+        return local.session
+
+    def send(entry: Dict[str, Any]) -> Dict[str, Any]:
+        payload = {"text": _replay_text(entry), "voice": entry["voice"], "speed": entry.get("speed") or 1.0}
+        if entry.get("output_profile"):
+            payload["output_profile"] = entry["output_profile"]
+        started = time.perf_counter()
+        try:
+            status = session().post(url, json=payload, timeout=timeout).status_code
+        except requests.RequestException:
+            status = 0
+        return {"latency_ms": (time.perf_counter() - started) * 1000.0, "status": status}
+
+    futures: List[Future] = []
+    max_lag = 0.0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for entry in records:
+            due = (float(entry["ts"]) - first_arrival) / max(speed, 1e-6)
+            delay = due - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+            futures.append(executor.submit(send, entry))
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+    for opened in sessions:
+        opened.close()
+
+    latencies = [result["latency_ms"] for result in results if 200 <= result["status"] < 300]
+    return {
+        "requests": len(results),
+        "ok": len(latencies),
+        "errors": len(results) - len(latencies),
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed else 0.0,
+        "latency_ms": {f"p{p}": _percentile(latencies, p) for p in (50, 90, 95, 99)},
+        "max_schedule_lag_ms": max_lag * 1000.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Reproduce tráfico capturado contra una instancia TTS.")
+    parser.add_argument("captures", type=Path, nargs="+", help="Archivos JSONL de captura")
+    parser.add_argument("--target", default="http://localhost:5000", help="URL base de la instancia")
+    parser.add_argument("--speed", type=float, default=1.0, help="Factor de aceleración (1 = tiempo real)")
+    parser.add_argument("--max-workers", type=int, default=64, help="Peticiones concurrentes máximas")
+    parser.add_argument("--limit", type=int, default=None, help="Reproducir sólo las primeras N peticiones")
+    args = parser.parse_args(argv)
+
+    records = load_capture(args.captures)[: args.limit]
+    summary = replay(records, args.target, speed=args.speed, max_workers=args.max_workers)
+    print(json.dumps(summary, indent=2))
+    return 0 if summary.get("errors", 0) == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
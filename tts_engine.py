@@ -1,22 +1,52 @@
 """Motor de síntesis basado en Piper."""
 
 from __future__ import annotations
+import importlib
 import inspect
+import io
 import json
+import os
 import re
 import shutil
+import string
 import threading
+import time
 import uuid
 import wave
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, ContextManager, Dict, Iterator, List, Tuple
 
-import numpy as np
-import soundfile as sf
-from piper.voice import PiperVoice
+from model_mmap import create_session
+from model_sync import ModelSyncError, SyncReport, sync_models
+from scheduler import DeadlineExceededError, SynthesisScheduler, Ticket
 
-from model_sync import sync_models_if_needed
+if TYPE_CHECKING:  # pragma: no cover - sólo para anotaciones
+    from piper.voice import PiperVoice
+
+
+class _LazyModule:
+    """Importa el módulo real recién en el primer acceso a uno de sus atributos.
+
+    ``numpy`` y ``soundfile`` no hacen falta hasta la primera síntesis; diferirlos
+    acorta el arranque del servidor, de la CLI y de cada worker nuevo.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module: Any = None
+
+    def __getattr__(self, attr: str) -> Any:
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+
+np = _LazyModule("numpy")
+sf = _LazyModule("soundfile")
 
 
 BASE_DIR = Path(__file__).parent
@@ -25,6 +55,62 @@ OUTPUT_DIR = BASE_DIR / "outputs"
 CONFIG_BACKUP_DIR = MODELS_DIR / ".config_backups"
 
 
+@dataclass(frozen=True)
+class OutputProfile:
+    """Formato de salida del audio: tasa de muestreo y codificación WAV."""
+
+    id: str
+    sample_rate: int | None
+    subtype: str
+    description: str
+
+    def as_public_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "sample_rate": self.sample_rate,
+            "subtype": self.subtype,
+            "description": self.description,
+        }
+
+
+OUTPUT_PROFILES: Dict[str, OutputProfile] = {
+    profile.id: profile
+    for profile in (
+        OutputProfile("native", None, "PCM_16", "Tasa nativa del modelo, PCM 16 bits"),
+        OutputProfile("pcm16k", 16000, "PCM_16", "16 kHz PCM 16 bits"),
+        OutputProfile("mulaw8k", 8000, "ULAW", "8 kHz μ-law para telefonía"),
+    )
+}
+DEFAULT_OUTPUT_PROFILE = os.environ.get("TTS_OUTPUT_PROFILE", "").strip() or "native"
+if DEFAULT_OUTPUT_PROFILE not in OUTPUT_PROFILES:
+    # Fallar al arrancar: si no, cada síntesis sin perfil explícito terminaría en error.
+    raise RuntimeError(
+        f"TTS_OUTPUT_PROFILE='{DEFAULT_OUTPUT_PROFILE}' no es un perfil válido "
+        f"(opciones: {', '.join(OUTPUT_PROFILES)})"
+    )
+
+# Campos del JSON de la voz que afectan la sesión ONNX o la fonetización; si
+# cambian hay que recargar el modelo. El resto de ``inference`` se aplica en vivo.
+_RELOAD_CONFIG_FIELDS: Tuple[Tuple[str, ...], ...] = (
+    ("num_symbols",),
+    ("num_speakers",),
+    ("audio", "sample_rate"),
+    ("espeak", "voice"),
+    ("phoneme_type",),
+    ("phoneme_map",),
+    ("phoneme_id_map",),
+)
+_INFERENCE_DEFAULTS: Dict[str, float] = {"noise_scale": 0.667, "length_scale": 1.0, "noise_w": 0.8}
+
+# Tope de la caché de fragmentos en bytes de PCM (float32): 64 MB son unos 12
+# minutos de audio a 22 050 Hz, sin importar cuántos fragmentos sean.
+FRAGMENT_CACHE_BYTES = int(os.environ.get("TTS_FRAGMENT_CACHE_BYTES", str(64 * 1024 * 1024)))
+CROSSFADE_MS = 15
+# Umbral de amplitud para recortar el silencio en los bordes de cada fragmento.
+_EDGE_SILENCE_THRESHOLD = 0.01
+_EDGE_PADDING_MS = 20
+
+
 @dataclass
 class VoiceInfo:
     id: str
@@ -35,6 +121,7 @@ class VoiceInfo:
     description: str
     model: Path
     config: Path
+    speaker_id: int | None = None
 
     def as_public_dict(self) -> Dict[str, str]:
         return {
@@ -59,6 +146,178 @@ class ConfigError(RuntimeError):
     pass
 
 
+class TemplateError(SynthesisError):
+    pass
+
+
+class StageTimings:
+    """Acumula el tiempo exclusivo (en ms) de cada etapa de una petición.
+
+    Las etapas anidadas descuentan su tiempo de la etapa que las contiene, de
+    modo que la suma de etapas nunca supera el tiempo total de la petición.
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self._children: List[float] = []
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        self._children.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            child_time = self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            self.stages[name] = self.stages.get(name, 0.0) + (elapsed - child_time) * 1000.0
+
+    @contextmanager
+    def activate(self) -> Iterator["StageTimings"]:
+        """Registra estas métricas como las del hilo actual mientras dure el bloque."""
+
+        previous = getattr(_timing_state, "current", None)
+        _timing_state.current = self
+        try:
+            yield self
+        finally:
+            _timing_state.current = previous
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(value, 3) for name, value in self.stages.items()}
+
+    def as_server_timing(self) -> str:
+        return ", ".join(f"{name};dur={value:.1f}" for name, value in self.stages.items())
+
+
+_timing_state = threading.local()
+
+
+def _measure(stage: str) -> ContextManager[None]:
+    timings = getattr(_timing_state, "current", None)
+    return timings.measure(stage) if timings is not None else nullcontext()
+
+
+def _parse_speaker_id(value: Any, config_path: Path) -> int | None:
+    """Normaliza y valida el ``speaker_id`` declarado en el catálogo o en la metadata.
+
+    Se contrasta con ``num_speakers`` y ``speaker_id_map`` del ``.onnx.json``:
+    un locutor en un modelo de un solo locutor hace fallar la inferencia
+    (ONNX Runtime no conoce la entrada ``sid``). Acepta el índice o el nombre
+    del locutor y lanza ``ValueError`` si no es válido.
+    """
+
+    if value is None:
+        return None
+    try:
+        config = json.loads(config_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        config = {}
+    speaker_map = config.get("speaker_id_map") if isinstance(config, dict) else None
+    speaker_map = speaker_map if isinstance(speaker_map, dict) else {}
+    num_speakers = config.get("num_speakers") if isinstance(config, dict) else None
+
+    if isinstance(value, str) and value in speaker_map:
+        value = speaker_map[value]
+    if isinstance(value, bool):
+        raise ValueError(f"speaker_id inválido: {value!r}")
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value.strip())
+    if not isinstance(value, int) or value < 0:
+        raise ValueError(f"speaker_id inválido: {value!r} (se espera un entero no negativo o un locutor conocido)")
+
+    if isinstance(num_speakers, int) and not isinstance(num_speakers, bool):
+        if num_speakers <= 1:
+            raise ValueError(f"speaker_id {value} declarado para un modelo de un solo locutor ({config_path.name})")
+        if value >= num_speakers:
+            raise ValueError(f"speaker_id {value} fuera de rango: {config_path.name} tiene {num_speakers} locutores")
+    return value
+
+
+def _lowpass_kernel(cutoff: float, taps: int = 63) -> np.ndarray:
+    """Filtro FIR sinc con ventana Hamming; ``cutoff`` en ciclos por muestra."""
+
+    n = np.arange(taps, dtype=np.float64) - (taps - 1) / 2.0
+    kernel = 2.0 * cutoff * np.sinc(2.0 * cutoff * n) * np.hamming(taps)
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+def _resample(audio: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Cambia la tasa de muestreo con operaciones vectorizadas de NumPy.
+
+    Al reducir la tasa se aplica antes un filtro anti-aliasing; la conversión
+    se hace por interpolación lineal sobre todo el bloque de una vez.
+    """
+
+    if src_rate == dst_rate or audio.shape[0] == 0:
+        return audio
+
+    data = audio.astype(np.float32, copy=False)
+    channels = data.reshape(data.shape[0], -1)
+
+    if dst_rate < src_rate:
+        # Corte un poco por debajo del Nyquist de destino para dejar banda de transición.
+        kernel = _lowpass_kernel(0.45 * dst_rate / src_rate)
+        channels = np.stack(
+            [np.convolve(channels[:, ch], kernel, mode="same") for ch in range(channels.shape[1])],
+            axis=1,
+        )
+
+    num_frames = max(1, int(round(channels.shape[0] * dst_rate / src_rate)))
+    positions = np.arange(num_frames, dtype=np.float64) * (src_rate / dst_rate)
+    source_index = np.arange(channels.shape[0], dtype=np.float64)
+    resampled = np.stack(
+        [np.interp(positions, source_index, channels[:, ch]) for ch in range(channels.shape[1])],
+        axis=1,
+    ).astype(np.float32)
+
+    return resampled[:, 0] if data.ndim == 1 else resampled
+
+
+def _trim_edge_silence(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Recorta el silencio inicial y final dejando un margen corto."""
+
+    if audio.shape[0] == 0:
+        return audio
+
+    level = np.abs(audio) if audio.ndim == 1 else np.abs(audio).max(axis=1)
+    voiced = np.flatnonzero(level > _EDGE_SILENCE_THRESHOLD)
+    if voiced.size == 0:
+        return audio
+
+    padding = int(sample_rate * _EDGE_PADDING_MS / 1000)
+    start = max(0, int(voiced[0]) - padding)
+    end = min(audio.shape[0], int(voiced[-1]) + 1 + padding)
+    return audio[start:end]
+
+
+def _crossfade_concat(chunks: List[np.ndarray], fade_frames: int) -> np.ndarray:
+    """Concatena los fragmentos con un fundido lineal corto en cada unión."""
+
+    pieces: List[np.ndarray] = []
+    previous = chunks[0]
+    for chunk in chunks[1:]:
+        overlap = min(fade_frames, previous.shape[0], chunk.shape[0])
+        if overlap <= 0:
+            pieces.append(previous)
+            previous = chunk
+            continue
+
+        ramp = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+        if previous.ndim > 1:
+            ramp = ramp[:, None]
+        blended = previous[-overlap:] * (1.0 - ramp) + chunk[:overlap] * ramp
+        pieces.append(previous[:-overlap])
+        previous = np.concatenate([blended, chunk[overlap:]], axis=0)
+
+    pieces.append(previous)
+    return np.concatenate(pieces, axis=0)
+
+
 def _load_catalog() -> List[VoiceInfo]:
     """Carga el catálogo de voces desde disco o lo reconstruye si falta."""
 
@@ -99,6 +358,12 @@ def _load_catalog() -> List[VoiceInfo]:
                 else model_path.with_suffix(model_path.suffix + ".json")
             )
 
+            try:
+                speaker_id = _parse_speaker_id(metadata.get("speaker_id"), config_path)
+            except ValueError:
+                # Se reporta en ``missing_voices``; sin omitirla fallaría en cada síntesis.
+                continue
+
             voices.append(
                 VoiceInfo(
                     id=str(metadata.get("id") or metadata.get("name") or voice_dir.name),
@@ -114,6 +379,7 @@ def _load_catalog() -> List[VoiceInfo]:
                     ),
                     model=model_path,
                     config=config_path,
+                    speaker_id=speaker_id,
                 )
             )
 
@@ -131,6 +397,13 @@ def _load_catalog() -> List[VoiceInfo]:
         config_path = MODELS_DIR / entry.get("config", "")
         if not model_path.exists():
             continue
+        if not config_path.exists():
+            config_path = model_path.with_suffix(model_path.suffix + ".json")
+        try:
+            speaker_id = _parse_speaker_id(entry.get("speaker_id"), config_path)
+        except ValueError:
+            # Se reporta en ``missing_voices``; sin omitirla fallaría en cada síntesis.
+            continue
 
         voices.append(
             VoiceInfo(
@@ -141,7 +414,8 @@ def _load_catalog() -> List[VoiceInfo]:
                 quality=str(entry.get("quality") or "Standard"),
                 description=str(entry.get("description") or "Modelo disponible"),
                 model=model_path,
-                config=config_path if config_path.exists() else model_path.with_suffix(model_path.suffix + ".json"),
+                config=config_path,
+                speaker_id=speaker_id,
             )
         )
 
@@ -158,6 +432,7 @@ def _load_catalog() -> List[VoiceInfo]:
                         "model": str(voice.model.relative_to(MODELS_DIR)),
                         "config": str(voice.config.relative_to(MODELS_DIR)),
                     }
+                    | ({"speaker_id": voice.speaker_id} if voice.speaker_id is not None else {})
                     for voice in rebuilt
                 ]
             }
@@ -175,16 +450,27 @@ def _load_catalog() -> List[VoiceInfo]:
 class TTSEngine:
     """Motor reutilizable que mantiene modelos en memoria."""
 
-    def __init__(self) -> None:
+    def __init__(self, *, auto_sync: bool = True) -> None:
         OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        # Con ``auto_sync`` desactivado un modelo dañado no dispara la resincro remota.
+        self._auto_sync = auto_sync
         self.voices: Dict[str, VoiceInfo] = {voice.id: voice for voice in _load_catalog()}
-        self._voice_cache: Dict[str, PiperVoice] = {}
+        # Las voces que comparten archivo ONNX (modelos multi-locutor) reutilizan
+        # la misma sesión cargada; el locutor se elige al momento de inferir.
+        self._model_cache: Dict[Path, PiperVoice] = {}
+        # PCM de los fragmentos estáticos de plantillas, por modelo, locutor,
+        # velocidad y texto; se descarta al cambiar la configuración del modelo.
+        self._fragment_cache: "OrderedDict[Tuple[Path, int | None, float, str], Tuple[np.ndarray, int]]" = (
+            OrderedDict()
+        )
+        self._fragment_bytes = 0
         self._lock = threading.Lock()
+        self.scheduler = SynthesisScheduler()
         self._sync_inflight = False
         self._ensure_config_backups()
 
     def missing_voices(self) -> List[Dict[str, str]]:
-        """Devuelve las voces del catálogo que no tienen sus archivos en disco."""
+        """Devuelve las voces del catálogo sin sus archivos en disco o con un ``speaker_id`` inválido."""
 
         catalog_path = MODELS_DIR / "catalog.json"
         try:
@@ -207,6 +493,11 @@ class TTSEngine:
 
             if not config_path.exists() or not config_path.is_file():
                 issues.append(f"Falta el archivo de configuración {config_path.name or config_path}")
+            elif entry.get("speaker_id") is not None:
+                try:
+                    _parse_speaker_id(entry.get("speaker_id"), config_path)
+                except ValueError as exc:
+                    issues.append(str(exc))
 
             if issues:
                 missing.append(
@@ -228,19 +519,77 @@ class TTSEngine:
             grouped[target].append(voice.as_public_dict())
         return grouped
 
+    @staticmethod
+    def output_profiles() -> List[Dict[str, Any]]:
+        return [profile.as_public_dict() for profile in OUTPUT_PROFILES.values()]
+
+    @staticmethod
+    def _get_output_profile(profile_id: str | None) -> OutputProfile:
+        try:
+            return OUTPUT_PROFILES[profile_id or DEFAULT_OUTPUT_PROFILE]
+        except KeyError as exc:
+            raise SynthesisError(f"Perfil de salida '{profile_id}' no soportado") from exc
+
     def _get_voice(self, voice_id: str) -> VoiceInfo:
         try:
             return self.voices[voice_id]
         except KeyError as exc:  # pragma: no cover - validación de entrada
             raise VoiceNotFoundError(f"Voz '{voice_id}' no está configurada") from exc
 
-    def _refresh_catalog(self) -> None:
-        """Recarga el catálogo de voces desde disco tras una resincro."""
+    def _refresh_catalog(self, report: SyncReport | None = None) -> None:
+        """Recarga el catálogo de voces desde disco tras una resincro.
+
+        Con el reporte de la sincronización sólo se descartan los modelos cuyos
+        archivos (ONNX o configuración) cambiaron; sin él se descartan todos.
+        """
 
-        self._voice_cache = {}
         self.voices = {voice.id: voice for voice in _load_catalog()}
+        if report is None:
+            self._model_cache = {}
+            self._fragment_cache.clear()
+            self._fragment_bytes = 0
+        else:
+            changed = {MODELS_DIR / relative for relative in report.changed_files}
+            stale = {
+                voice.model
+                for voice in self.voices.values()
+                if voice.model in changed or voice.config in changed
+            }
+            in_use = {voice.model for voice in self.voices.values()}
+            self._model_cache = {
+                model: loaded
+                for model, loaded in self._model_cache.items()
+                if model in in_use and model not in stale
+            }
+            for model in stale:
+                self._drop_fragments(model)
         self._ensure_config_backups()
 
+    def _drop_fragments(self, model: Path) -> None:
+        for key in [key for key in self._fragment_cache if key[0] == model]:
+            audio_data, _ = self._fragment_cache.pop(key)
+            self._fragment_bytes -= audio_data.nbytes
+
+    def _cache_fragment(self, key: Tuple[Path, int | None, float, str], fragment: Tuple[np.ndarray, int]) -> None:
+        """Guarda un fragmento y descarta los menos usados hasta volver al tope de bytes."""
+
+        size = fragment[0].nbytes
+        if size > FRAGMENT_CACHE_BYTES:
+            return
+        self._fragment_cache[key] = fragment
+        self._fragment_bytes += size
+        while self._fragment_bytes > FRAGMENT_CACHE_BYTES:
+            _, (evicted, _) = self._fragment_cache.popitem(last=False)
+            self._fragment_bytes -= evicted.nbytes
+
+    def resync_models(self) -> SyncReport:
+        """Sincroniza con el repositorio remoto y recarga sólo las voces que cambiaron."""
+
+        report = sync_models()
+        with self._lock:
+            self._refresh_catalog(report)
+        return report
+
     def _backup_path_for(self, config_path: Path) -> Path:
         try:
             relative = config_path.relative_to(MODELS_DIR)
@@ -279,7 +628,64 @@ class TTSEngine:
             "path": str(voice.config),
         }
 
-    def update_config(self, voice_id: str, raw_content: str) -> Dict[str, str]:
+    @staticmethod
+    def _parse_config_text(raw_content: str) -> Any:
+        try:
+            return json.loads(raw_content)
+        except json.JSONDecodeError:
+            return None
+
+    @staticmethod
+    def _config_value(data: Any, path: Tuple[str, ...]) -> Any:
+        for key in path:
+            if not isinstance(data, dict):
+                return None
+            data = data.get(key)
+        return data
+
+    def _apply_config_change(self, voice: VoiceInfo, previous: Any, current: Any) -> bool:
+        """Aplica la nueva configuración al modelo cargado.
+
+        Devuelve ``True`` si el modelo debe recargarse desde disco; si sólo
+        cambiaron parámetros de inferencia se actualizan en la sesión viva.
+        Debe llamarse con ``self._lock`` tomado, el mismo que cubrió la
+        escritura del archivo.
+        """
+
+        # Los fragmentos cacheados se sintetizaron con los parámetros anteriores.
+        self._drop_fragments(voice.model)
+
+        cached = self._model_cache.get(voice.model)
+        if cached is None:
+            return False
+
+        needs_reload = not isinstance(previous, dict) or not isinstance(current, dict)
+        if not needs_reload:
+            needs_reload = any(
+                self._config_value(previous, path) != self._config_value(current, path)
+                for path in _RELOAD_CONFIG_FIELDS
+            )
+
+        inference: Dict[str, float] = {}
+        if not needs_reload:
+            raw_inference = current.get("inference")
+            raw_inference = raw_inference if isinstance(raw_inference, dict) else {}
+            for key, default in _INFERENCE_DEFAULTS.items():
+                value = raw_inference.get(key, default)
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    needs_reload = True
+                    break
+                inference[key] = float(value)
+
+        if needs_reload:
+            self._model_cache.pop(voice.model, None)
+            return True
+
+        for key, value in inference.items():
+            setattr(cached.config, key, value)
+        return False
+
+    def update_config(self, voice_id: str, raw_content: str) -> Dict[str, Any]:
         voice = self._get_voice(voice_id)
         self._ensure_config_backups()
 
@@ -288,33 +694,48 @@ class TTSEngine:
         except json.JSONDecodeError as exc:
             raise ConfigError("El archivo de configuración no es un JSON válido") from exc
 
-        try:
-            formatted = json.dumps(parsed, ensure_ascii=False, indent=2)
-            voice.config.write_text(formatted + "\n", encoding="utf-8")
-        except OSError as exc:
-            raise ConfigError("No se pudo guardar el archivo de configuración") from exc
+        formatted = json.dumps(parsed, ensure_ascii=False, indent=2)
+        # Una sola sección crítica: ninguna síntesis ve el archivo nuevo con la
+        # sesión vieja, y dos cambios simultáneos no comparan contra el mismo original.
+        with self._lock:
+            try:
+                previous = self._parse_config_text(voice.config.read_text(encoding="utf-8"))
+            except OSError:
+                previous = None
 
-        self._voice_cache.pop(voice.id, None)
-        return {"config": formatted}
+            try:
+                voice.config.write_text(formatted + "\n", encoding="utf-8")
+            except OSError as exc:
+                raise ConfigError("No se pudo guardar el archivo de configuración") from exc
+
+            reloaded = self._apply_config_change(voice, previous, parsed)
+        return {"config": formatted, "model_reload": reloaded}
 
-    def restore_config(self, voice_id: str) -> Dict[str, str]:
+    def restore_config(self, voice_id: str) -> Dict[str, Any]:
         voice = self._get_voice(voice_id)
         backup_path = self._backup_path_for(voice.config)
 
         if not backup_path.exists():
             raise ConfigError("No existe un respaldo para esta configuración")
 
-        try:
-            voice.config.write_text(backup_path.read_text(encoding="utf-8"), encoding="utf-8")
-        except OSError as exc:
-            raise ConfigError("No se pudo restaurar el archivo de configuración") from exc
+        with self._lock:
+            try:
+                previous = self._parse_config_text(voice.config.read_text(encoding="utf-8"))
+            except OSError:
+                previous = None
 
-        self._voice_cache.pop(voice.id, None)
-        return {"config": self._read_config(voice)}
+            try:
+                restored = backup_path.read_text(encoding="utf-8")
+                voice.config.write_text(restored, encoding="utf-8")
+            except OSError as exc:
+                raise ConfigError("No se pudo restaurar el archivo de configuración") from exc
+
+            reloaded = self._apply_config_change(voice, previous, self._parse_config_text(restored))
+        return {"config": self._read_config(voice), "model_reload": reloaded}
 
     def _load_or_get_model(self, voice: VoiceInfo) -> PiperVoice:
-        if voice.id in self._voice_cache:
-            return self._voice_cache[voice.id]
+        if voice.model in self._model_cache:
+            return self._model_cache[voice.model]
 
         if not voice.model.exists():
             raise SynthesisError(f"No se encontró el modelo: {voice.model.name}")
@@ -322,8 +743,12 @@ class TTSEngine:
             raise SynthesisError(f"No se encontró el archivo de configuración: {voice.config.name}")
 
         try:
-            loaded = PiperVoice.load(str(voice.model), config_path=str(voice.config))
+            with _measure("model_load"):
+                loaded = self._load_model(voice)
         except Exception as exc:  # pragma: no cover - depende del estado del modelo
+            if not self._auto_sync:
+                raise SynthesisError(f"No se pudo cargar el modelo: {voice.model.name}") from exc
+
             # Si la carga falla, intentar una resincro rápida de modelos una sola vez.
             if self._sync_inflight:
                 raise SynthesisError(
@@ -332,140 +757,414 @@ class TTSEngine:
 
             self._sync_inflight = True
             try:
-                synced, message = sync_models_if_needed()
-                if synced:
-                    self._refresh_catalog()
-                    # Reintentar con la información refrescada del catálogo.
-                    voice = self._get_voice(voice.id)
-                    loaded = PiperVoice.load(str(voice.model), config_path=str(voice.config))
-                else:
+                try:
+                    with _measure("model_sync"):
+                        report = sync_models()
+                except ModelSyncError as sync_exc:
                     raise SynthesisError(
-                        "No se pudieron re-sincronizar los modelos automáticamente: " + message
+                        "No se pudieron re-sincronizar los modelos automáticamente: " + str(sync_exc)
                     ) from exc
+                self._refresh_catalog(report)
+                # Reintentar con la información refrescada del catálogo.
+                voice = self._get_voice(voice.id)
+                with _measure("model_load"):
+                    loaded = self._load_model(voice)
             finally:
                 self._sync_inflight = False
-        self._voice_cache[voice.id] = loaded
+        self._instrument_model(loaded)
+        self._model_cache[voice.model] = loaded
         return loaded
 
-    def synthesize(self, text: str, voice_id: str, speed: float = 1.0) -> Tuple[str, Path]:
+    @staticmethod
+    def _load_model(voice: VoiceInfo) -> PiperVoice:
+        """Equivale a ``PiperVoice.load`` pero con los pesos mapeados en memoria."""
+
+        from piper.config import PiperConfig
+        from piper.voice import PiperVoice
+
+        config = json.loads(voice.config.read_text(encoding="utf-8"))
+        return PiperVoice(config=PiperConfig.from_dict(config), session=create_session(voice.model))
+
+    @staticmethod
+    def _instrument_model(model: PiperVoice) -> None:
+        """Envuelve ``phonemize`` para medirlo por separado de la inferencia."""
+
+        phonemize = getattr(model, "phonemize", None)
+        if phonemize is None:
+            return
+
+        def timed_phonemize(*args: Any, **kwargs: Any) -> Any:
+            with _measure("phonemize"):
+                return phonemize(*args, **kwargs)
+
+        try:
+            model.phonemize = timed_phonemize  # type: ignore[method-assign]
+        except AttributeError:  # pragma: no cover - dependiente de versión
+            pass
+
+    @contextmanager
+    def _locked(
+        self, voice: VoiceInfo, chars: int, deadline_ms: float | None = None
+    ) -> Iterator[Ticket]:
+        """Espera el turno asignado por el planificador y toma el lock del motor."""
+
+        deadline = None if deadline_ms is None else time.monotonic() + deadline_ms / 1000.0
+        with _measure("lock_wait"):
+            ticket = self.scheduler.acquire(voice.id, chars, deadline)
+            self._lock.acquire()
+        try:
+            yield ticket
+        except BaseException:
+            ticket.failed = True
+            raise
+        finally:
+            self._lock.release()
+            self.scheduler.release(ticket)
+
+    def estimate_cost(self, voice_id: str, text: str) -> Dict[str, float]:
+        """Estimación de duración de síntesis y de espera en cola para un texto."""
+
+        voice = self._get_voice(voice_id)
+        return self.scheduler.estimate(voice.id, self._segment_chars(self._split_text_by_pause_tags(text)))
+
+    @staticmethod
+    def _segment_chars(segments: List[Tuple[str, int | str]]) -> int:
+        return sum(len(str(content)) for kind, content in segments if kind == "text")
+
+    def synthesize(
+        self,
+        text: str,
+        voice_id: str,
+        speed: float = 1.0,
+        output_profile: str | None = None,
+        output_path: Path | None = None,
+        timings: StageTimings | None = None,
+        deadline_ms: float | None = None,
+    ) -> Tuple[str, Path]:
+        with timings.activate() if timings is not None else nullcontext():
+            return self._synthesize(text, voice_id, speed, output_profile, output_path, deadline_ms)
+
+    def synthesize_raw(
+        self,
+        text: str,
+        voice_id: str,
+        speed: float = 1.0,
+        output_profile: str | None = None,
+        timings: StageTimings | None = None,
+    ) -> Tuple[bytes, int]:
+        """Sintetiza y devuelve el audio crudo (sin cabecera WAV) y su tasa de muestreo.
+
+        Todo ocurre en memoria: la síntesis incremental no pasa por disco.
+        """
+
         if not text.strip():
             raise SynthesisError("El texto está vacío")
 
         voice = self._get_voice(voice_id)
+        profile = self._get_output_profile(output_profile)
         length_scale = max(0.25, min(4.0, 1.0 / max(speed, 0.1)))
-        filename = f"tts_{uuid.uuid4().hex}.wav"
-        output_path = OUTPUT_DIR / filename
-
         segments = self._split_text_by_pause_tags(text)
 
-        if len(segments) == 1 and segments[0][0] == "text":
-            with self._lock:
+        with timings.activate() if timings is not None else nullcontext():
+            with self._locked(voice, self._segment_chars(segments)) as ticket:
                 model = self._load_or_get_model(voice)
-                self._synthesize_to_file(model, text, output_path, length_scale)
-            return filename, output_path
+                ticket.mark_work()
+                audio_data, sample_rate = self._render_segments(model, voice, segments, length_scale, profile)
 
-        with self._lock:
+            with _measure("encode"):
+                buffer = io.BytesIO()
+                sf.write(buffer, audio_data, sample_rate, format="RAW", subtype=profile.subtype)
+        return buffer.getvalue(), sample_rate
+
+    def _synthesize(
+        self,
+        text: str,
+        voice_id: str,
+        speed: float,
+        output_profile: str | None,
+        output_path: Path | None,
+        deadline_ms: float | None = None,
+    ) -> Tuple[str, Path]:
+        if not text.strip():
+            raise SynthesisError("El texto está vacío")
+
+        voice = self._get_voice(voice_id)
+        profile = self._get_output_profile(output_profile)
+        length_scale = max(0.25, min(4.0, 1.0 / max(speed, 0.1)))
+        if output_path is None:
+            output_path = OUTPUT_DIR / f"tts_{uuid.uuid4().hex}.wav"
+        filename = output_path.name
+
+        segments = self._split_text_by_pause_tags(text)
+
+        # Con o sin pausas el audio se arma en memoria, ya en el formato del
+        # perfil, y se escribe una sola vez fuera del lock.
+        with self._locked(voice, self._segment_chars(segments), deadline_ms) as ticket:
             model = self._load_or_get_model(voice)
-            self._synthesize_with_pauses(model, voice, segments, output_path, length_scale)
+            ticket.mark_work()
+            audio_data, sample_rate = self._render_segments(model, voice, segments, length_scale, profile)
 
+        try:
+            with _measure("write"):
+                sf.write(output_path, audio_data, sample_rate, subtype=profile.subtype)
+        except (OSError, RuntimeError) as exc:
+            raise SynthesisError("No se pudo guardar el audio sintetizado") from exc
         return filename, output_path
 
     def _synthesize_to_file(
-        self, model: PiperVoice, text: str, output_path: Path, length_scale: float
+        self,
+        model: PiperVoice,
+        text: str,
+        output_path: Path | BinaryIO,
+        length_scale: float,
+        speaker_id: int | None = None,
     ) -> None:
-        """Genera el audio manejando versiones nuevas y antiguas de Piper."""
+        """Genera el audio manejando versiones nuevas y antiguas de Piper.
+
+        ``length_scale`` viene de la velocidad pedida y se combina con el
+        ``inference.length_scale`` configurado en la voz: Piper sólo usa el de
+        la configuración cuando no recibe uno explícito.
+
+        ``output_path`` puede ser una ruta o un buffer binario en memoria.
+        """
+
+        configured = getattr(getattr(model, "config", None), "length_scale", None)
+        if isinstance(configured, (int, float)) and configured > 0:
+            length_scale = max(0.25, min(4.0, length_scale * float(configured)))
+        synth_kwargs: Dict[str, Any] = {"length_scale": length_scale}
+        if speaker_id is not None:
+            synth_kwargs["speaker_id"] = speaker_id
 
         sig = inspect.signature(model.synthesize)
         params = list(sig.parameters.values())
 
-        try:
-            # Versiones recientes exigen ``wav_file`` como argumento posicional
-            # y esperan un manejador abierto, no una ruta en cadena.
-            if len(params) >= 2 and params[1].name == "wav_file":
-                with wave.open(str(output_path), "wb") as wav_file:
-                    model.synthesize(text, wav_file, length_scale=length_scale)
-                return
-
-            # Versiones antiguas devuelven los bytes o el tuple (audio, sample_rate).
-            audio_output = model.synthesize(text, length_scale=length_scale)
-        except TypeError as exc:
-            # Si la introspección falló, intenta la ruta inversa.
+        with _measure("inference"):
             try:
-                model.synthesize(text, str(output_path), length_scale=length_scale)
-                return
-            except TypeError as inner_exc:  # pragma: no cover - dependiente de versión
-                raise SynthesisError(
-                    "La firma de PiperVoice.synthesize no es compatible: se esperaba un path o un manejador WAV."
-                ) from inner_exc
-        
+                # Versiones recientes exigen ``wav_file`` como argumento posicional
+                # y esperan un manejador abierto, no una ruta en cadena.
+                if len(params) >= 2 and params[1].name == "wav_file":
+                    target = str(output_path) if isinstance(output_path, Path) else output_path
+                    with wave.open(target, "wb") as wav_file:
+                        model.synthesize(text, wav_file, **synth_kwargs)
+                    return
+
+                # Versiones antiguas devuelven los bytes o el tuple (audio, sample_rate).
+                audio_output = model.synthesize(text, **synth_kwargs)
+            except TypeError as exc:
+                # Si la introspección falló, intenta la ruta inversa.
+                try:
+                    target = str(output_path) if isinstance(output_path, Path) else output_path
+                    model.synthesize(text, target, **synth_kwargs)
+                    return
+                except TypeError as inner_exc:  # pragma: no cover - dependiente de versión
+                    raise SynthesisError(
+                        "La firma de PiperVoice.synthesize no es compatible: se esperaba un path o un manejador WAV."
+                    ) from inner_exc
+                except Exception as inner_exc:
+                    raise SynthesisError(f"Falló la inferencia del modelo: {inner_exc}") from inner_exc
+            except Exception as exc:
+                # ONNX Runtime lanza sus propias excepciones, que no derivan de RuntimeError.
+                raise SynthesisError(f"Falló la inferencia del modelo: {exc}") from exc
+
         if isinstance(audio_output, tuple):
             audio_data, sample_rate = audio_output
-            sf.write(output_path, audio_data, int(sample_rate))
+            with _measure("write"):
+                sf.write(output_path, audio_data, int(sample_rate), format="WAV")
         elif isinstance(audio_output, (bytes, bytearray)):
-            output_path.write_bytes(audio_output)
+            with _measure("write"):
+                if isinstance(output_path, Path):
+                    output_path.write_bytes(audio_output)
+                else:
+                    output_path.write(audio_output)
         else:
             raise SynthesisError("La librería Piper devolvió un formato de audio inesperado")
 
-    def _synthesize_with_pauses(
+    def _render_segments(
         self,
         model: PiperVoice,
         voice: VoiceInfo,
         segments: List[Tuple[str, int | str]],
-        output_path: Path,
         length_scale: float,
-    ) -> None:
-        sample_rate = self._get_sample_rate(voice)
+        profile: OutputProfile,
+        render: Callable[[str, str], Tuple[np.ndarray, int]] | None = None,
+        crossfade_ms: int = 0,
+    ) -> Tuple[np.ndarray, int]:
+        """Sintetiza texto y pausas en memoria, a la tasa del perfil si la fija.
+
+        ``render`` recibe el tipo y el texto de cada parte que no es pausa y
+        devuelve su audio (por defecto se sintetiza directamente); con
+        ``crossfade_ms`` las uniones se suavizan con un fundido.
+        """
+
+        if render is None:
+
+            def render(kind: str, text: str) -> Tuple[np.ndarray, int]:
+                return self._synthesize_segment(model, voice, text, length_scale)
+
+        sample_rate = profile.sample_rate or self._get_sample_rate(voice)
         num_channels = self._get_num_channels(voice)
-        temp_files: List[Path] = []
         audio_chunks: List[np.ndarray] = []
 
+        for kind, content in segments:
+            if kind == "pause":
+                pause_ms = int(content)
+                silence = self._build_silence(sample_rate, num_channels, pause_ms)
+                if silence is not None:
+                    audio_chunks.append(silence)
+                continue
+
+            audio_data, part_sample_rate = render(kind, str(content))
+
+            if sample_rate is None:
+                sample_rate = part_sample_rate
+            elif part_sample_rate != int(sample_rate):
+                # Partes con otra tasa se remuestrean para poder concatenarlas.
+                audio_data = _resample(audio_data, part_sample_rate, int(sample_rate))
+
+            if audio_data.ndim > 1:
+                num_channels = audio_data.shape[1]
+            else:
+                num_channels = 1
+
+            audio_chunks.append(audio_data)
+
+        if not audio_chunks:
+            raise SynthesisError("El texto no contiene fragmentos sintetizables")
+
+        if sample_rate is None:
+            raise SynthesisError("No se pudo determinar la tasa de muestreo para el audio de salida")
+
+        fade_frames = int(int(sample_rate) * crossfade_ms / 1000)
+        return _crossfade_concat(audio_chunks, fade_frames), int(sample_rate)
+
+    def _synthesize_segment(
+        self, model: PiperVoice, voice: VoiceInfo, text: str, length_scale: float
+    ) -> Tuple[np.ndarray, int]:
+        """Sintetiza un fragmento y lo devuelve como audio float32 en memoria."""
+
+        buffer = io.BytesIO()
+        self._synthesize_to_file(model, text, buffer, length_scale, voice.speaker_id)
+        buffer.seek(0)
         try:
-            for kind, content in segments:
-                if kind == "pause":
-                    pause_ms = int(content)
-                    silence = self._build_silence(sample_rate, num_channels, pause_ms)
-                    if silence is not None:
-                        audio_chunks.append(silence)
-                    continue
-
-                part_path = OUTPUT_DIR / f"part_{uuid.uuid4().hex}.wav"
-                text_chunk = str(content)
-                self._synthesize_to_file(model, text_chunk, part_path, length_scale)
-                temp_files.append(part_path)
-
-                audio_data, part_sample_rate = sf.read(part_path, dtype="float32")
-
-                if part_sample_rate <= 0:
-                    raise SynthesisError("La parte sintetizada tiene una tasa de muestreo inválida")
-
-                if sample_rate is None:
-                    sample_rate = int(part_sample_rate)
-                elif int(part_sample_rate) != int(sample_rate):
-                    raise SynthesisError(
-                        "Las partes sintetizadas tienen diferentes tasas de muestreo; no se pueden concatenar"
-                    )
+            audio_data, part_sample_rate = sf.read(buffer, dtype="float32")
+        except RuntimeError as exc:  # pragma: no cover - dependiente de Piper
+            raise SynthesisError("Piper devolvió un audio que no se pudo decodificar") from exc
 
-                if audio_data.ndim > 1:
-                    num_channels = audio_data.shape[1]
-                else:
-                    num_channels = 1
+        if part_sample_rate <= 0:
+            raise SynthesisError("La parte sintetizada tiene una tasa de muestreo inválida")
 
-                audio_chunks.append(audio_data)
+        return audio_data, int(part_sample_rate)
 
-            if not audio_chunks:
-                raise SynthesisError("El texto no contiene fragmentos sintetizables")
+    def synthesize_template(
+        self,
+        template: str,
+        values: Dict[str, Any],
+        voice_id: str,
+        speed: float = 1.0,
+        output_profile: str | None = None,
+        timings: StageTimings | None = None,
+        deadline_ms: float | None = None,
+    ) -> Tuple[str, Path]:
+        """Sintetiza una plantilla con huecos ``{nombre}``.
+
+        Los fragmentos fijos se sintetizan una vez por voz y se guardan como PCM;
+        en cada petición sólo se sintetizan los valores de los huecos y las
+        piezas se unen con fundidos cortos.
+        """
+
+        with timings.activate() if timings is not None else nullcontext():
+            return self._synthesize_template(template, values, voice_id, speed, output_profile, deadline_ms)
+
+    def _synthesize_template(
+        self,
+        template: str,
+        values: Dict[str, Any],
+        voice_id: str,
+        speed: float,
+        output_profile: str | None,
+        deadline_ms: float | None = None,
+    ) -> Tuple[str, Path]:
+        parts = self._parse_template(template, values)
+        voice = self._get_voice(voice_id)
+        profile = self._get_output_profile(output_profile)
+        length_scale = max(0.25, min(4.0, 1.0 / max(speed, 0.1)))
+        output_path = OUTPUT_DIR / f"tts_{uuid.uuid4().hex}.wav"
+
+        # Sólo cuentan para el costo los fragmentos que aún no están cacheados.
+        chars = sum(
+            len(str(content))
+            for kind, content in parts
+            if kind == "slot"
+            or (
+                kind == "static"
+                and (voice.model, voice.speaker_id, round(length_scale, 4), str(content)) not in self._fragment_cache
+            )
+        )
 
-            if sample_rate is None:
-                raise SynthesisError("No se pudo determinar la tasa de muestreo para el audio de salida")
+        if not any(kind != "pause" for kind, _ in parts):
+            raise TemplateError("La plantilla no contiene fragmentos sintetizables")
+
+        def render(kind: str, text: str) -> Tuple[np.ndarray, int]:
+            if kind == "slot":
+                audio_data, rate = self._synthesize_segment(model, voice, text, length_scale)
+                return _trim_edge_silence(audio_data, rate), rate
+
+            key = (voice.model, voice.speaker_id, round(length_scale, 4), text)
+            cached = self._fragment_cache.get(key)
+            if cached is None:
+                audio_data, rate = self._synthesize_segment(model, voice, text, length_scale)
+                # Copia: el recorte es una vista y retendría el búfer completo sin contarlo.
+                cached = (_trim_edge_silence(audio_data, rate).copy(), rate)
+                self._cache_fragment(key, cached)
+            else:
+                self._fragment_cache.move_to_end(key)
+            return cached
+
+        with self._locked(voice, chars, deadline_ms) as ticket:
+            model = self._load_or_get_model(voice)
+            ticket.mark_work()
+            merged, sample_rate = self._render_segments(
+                model, voice, parts, length_scale, profile, render=render, crossfade_ms=CROSSFADE_MS
+            )
 
-            merged = np.concatenate(audio_chunks, axis=0)
-            sf.write(output_path, merged, int(sample_rate))
-        finally:
-            for part in temp_files:
-                try:
-                    part.unlink()
-                except OSError:
-                    pass
+        with _measure("write"):
+            sf.write(output_path, merged, sample_rate, subtype=profile.subtype)
+
+        return output_path.name, output_path
+
+    @classmethod
+    def _parse_template(cls, template: str, values: Dict[str, Any]) -> List[Tuple[str, int | str]]:
+        """Divide la plantilla en fragmentos fijos, huecos resueltos y pausas."""
+
+        if not template.strip():
+            raise TemplateError("La plantilla está vacía")
+
+        try:
+            parsed = list(string.Formatter().parse(template))
+        except ValueError as exc:
+            raise TemplateError(f"La plantilla no es válida: {exc}") from exc
+
+        parts: List[Tuple[str, int | str]] = []
+        for literal, field_name, _, _ in parsed:
+            for kind, content in cls._split_text_by_pause_tags(literal) if literal.strip() else []:
+                parts.append(("static" if kind == "text" else kind, content))
+
+            if field_name is None:
+                continue
+            if not field_name or field_name not in values:
+                raise TemplateError(f"Falta el valor para '{{{field_name}}}' en la plantilla")
+
+            value = str(values[field_name]).strip()
+            if value:
+                for kind, content in cls._split_text_by_pause_tags(value):
+                    parts.append(("slot" if kind == "text" else kind, content))
+
+        # Fragmentos sólo de puntuación (", ", ".") no producen audio útil.
+        return [
+            (kind, content)
+            for kind, content in parts
+            if kind == "pause" or any(char.isalnum() for char in str(content))
+        ]
 
     @staticmethod
     def _split_text_by_pause_tags(text: str) -> List[Tuple[str, int | str]]:
@@ -545,6 +1244,12 @@ __all__ = [
     "SynthesisError",
     "VoiceInfo",
     "OUTPUT_DIR",
+    "OUTPUT_PROFILES",
+    "DEFAULT_OUTPUT_PROFILE",
+    "OutputProfile",
+    "StageTimings",
     "ConfigError",
+    "TemplateError",
+    "DeadlineExceededError",
     "CONFIG_BACKUP_DIR",
 ]